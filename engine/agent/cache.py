@@ -0,0 +1,101 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+from engine.packages.log import Logger
+from engine.packages.red import Red
+
+# seconds a cached completion stays valid, per prompt key
+TTLS = {
+    "extract_info": 6 * 60 * 60,
+    "testing": 24 * 60 * 60,
+}
+
+DEFAULT_TTL = 60 * 60
+
+
+class ResponseCache:
+    """
+    Two tier cache for completions keyed by a hash of model, system prompt and user content.
+    An in-process LRU sits in front of redis so hot prompts never leave the process.
+    """
+
+    def __init__(self, kv: Red, size: int = 1024, ttls: Optional[dict[str, int]] = None):
+        """
+        Initialize the ResponseCache.
+
+        Args:
+            kv (Red): Redis client used as the shared tier.
+            size (int, optional): Max entries in the local LRU. Defaults to 1024.
+            ttls (dict, optional): TTL in seconds per prompt key. Defaults to TTLS.
+        """
+        self.kv = kv
+        self.size = size
+        self.ttls = ttls or TTLS
+        self.local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.stats = {"hits": 0, "local_hits": 0, "misses": 0}
+        self.logger = Logger("cache", persist=True)
+
+    @staticmethod
+    def key(model: str, system: str, content: str) -> str:
+        digest = hashlib.sha256("\x00".join((model, system, content)).encode()).hexdigest()
+        return f"llm:{digest}"
+
+    def ttl(self, prompt_key: Optional[str]) -> int:
+        return self.ttls.get(prompt_key or "", DEFAULT_TTL)
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Looks a completion up in the local tier, then in redis.
+
+        Args:
+            key (str): Cache key from ResponseCache.key
+
+        Returns:
+            Optional[str]: The cached completion, or None on a miss
+        """
+        entry = self.local.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.local.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["local_hits"] += 1
+            return entry[1]
+        if entry:
+            del self.local[key]
+
+        try:
+            value = await self.kv.red.get(key)
+            ttl = await self.kv.red.ttl(key) if value is not None else 0
+        except Exception as e:
+            self.logger.error(f"error reading {key} from redis: {e}")
+            value = None
+
+        if value is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        self._remember(key, value, max(ttl, 1))
+        return value
+
+    async def set(self, key: str, value: str, prompt_key: Optional[str] = None):
+        """
+        Stores a completion in both tiers with the TTL of its prompt key.
+
+        Args:
+            key (str): Cache key from ResponseCache.key
+            value (str): The raw completion text
+            prompt_key (str, optional): Prompt key used to pick the TTL
+        """
+        ttl = self.ttl(prompt_key)
+        self._remember(key, value, ttl)
+        try:
+            await self.kv.red.set(key, value, ex=ttl)
+        except Exception as e:
+            self.logger.error(f"error writing {key} to redis: {e}")
+
+    def _remember(self, key: str, value: str, ttl: int):
+        self.local[key] = (time.monotonic() + ttl, value)
+        self.local.move_to_end(key)
+        while len(self.local) > self.size:
+            self.local.popitem(last=False)
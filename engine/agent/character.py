@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from engine.packages.log import Logger
+from engine.packages.red import Red
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "character", "character.json")
+# redis channel carrying a full character JSON to swap in on every process
+CHANNEL = "character:reload"
+# seconds between checks of the file's mtime
+CHECK_INTERVAL = 2.0
+
+
+def system_prompt(character: dict) -> str:
+    """
+    Builds the system prompt for the AI model based on character data.
+
+    Args:
+        character (dict): The character definition
+
+    Returns:
+        str: The formatted system prompt
+    """
+    return f"""
+                YOU ARE {character["name"]},
+                YOUR BIO: {" ".join(character["bio"])}
+                YOUR PERSONALITY TRAITS: {", ".join(character["adjectives"])}
+                YOU KNOW ABOUT: {", ".join(character["topics"])}
+                COMMUNICATION STYLE: {(
+                    " ".join(character["style"]["all"])
+                    + " "
+                    + " ".join(character["style"]["chat"])
+                )}
+
+                IMPORTANT: You MUST respond IN THE PROPER FORMAT GIVEN TO YOU.
+
+                Keep your responses authentic to your character. Never break character.
+                """
+
+
+def validate(character) -> list[str]:
+    """
+    Checks a character has everything system_prompt reads.
+
+    Args:
+        character: The parsed character definition
+
+    Returns:
+        list[str]: Problems found, empty if it's valid
+    """
+    if not isinstance(character, dict):
+        return ["character is not a JSON object"]
+    problems = []
+    if not isinstance(character.get("name"), str) or not character["name"]:
+        problems.append('"name" should be a non-empty string')
+    for field in ("bio", "adjectives", "topics"):
+        if not isinstance(character.get(field), list):
+            problems.append(f'"{field}" should be a list')
+    style = character.get("style")
+    if not isinstance(style, dict):
+        problems.append('"style" should be an object')
+    else:
+        for field in ("all", "chat"):
+            if not isinstance(style.get(field), list):
+                problems.append(f'"style.{field}" should be a list')
+    return problems
+
+
+class CharacterStore:
+    """
+    Process wide holder of the character and its compiled system prompt. The
+    prompt is compiled once per character version, and a new version is picked
+    up from the file's mtime or a redis broadcast and swapped in atomically for
+    every AI instance.
+    """
+
+    _stores: dict[str, "CharacterStore"] = {}
+
+    def __init__(self, path: str = PATH):
+        self.path = path
+        self.logger = Logger("character", persist=True)
+        self.mtime = 0
+        self.checked = 0.0
+        self.listener: asyncio.Task | None = None
+        self.retry_at = 0.0
+        # (version, character, system prompt), replaced as a whole so readers never see a mix
+        self.snapshot: tuple[str, dict, str] = ("", {}, "")
+        self.load()
+
+    @classmethod
+    def get(cls, path: str = PATH) -> "CharacterStore":
+        """Returns the shared store for a character file."""
+        path = os.path.abspath(path)
+        if path not in cls._stores:
+            cls._stores[path] = cls(path)
+        return cls._stores[path]
+
+    @property
+    def character(self) -> dict:
+        self.check()
+        return self.snapshot[1]
+
+    @property
+    def system(self) -> str:
+        self.check()
+        return self.snapshot[2]
+
+    @property
+    def version(self) -> str:
+        return self.snapshot[0]
+
+    def check(self):
+        """Reloads the file if its mtime moved, at most once per CHECK_INTERVAL."""
+        now = time.monotonic()
+        if now - self.checked < CHECK_INTERVAL:
+            return
+        self.checked = now
+        try:
+            if os.stat(self.path).st_mtime_ns != self.mtime:
+                self.load()
+        except OSError as e:
+            self.logger.error(f"error checking {self.path}: {e}")
+
+    def load(self):
+        """Reads the character file and swaps it in, keeping the old version if it's invalid."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                raw = f.read()
+            self.swap(json.loads(raw))
+            self.mtime = mtime
+        except Exception as e:
+            if not self.snapshot[1]:
+                raise
+            self.logger.error(f"keeping character {self.version}, failed to load {self.path}: {e}")
+
+    def swap(self, character: dict):
+        """
+        Swaps a character in, compiling its system prompt once.
+
+        Raises:
+            ValueError: If the character is invalid, the current one is kept
+        """
+        problems = validate(character)
+        if problems:
+            raise ValueError(f"invalid character: {', '.join(problems)}")
+        version = hashlib.sha256(json.dumps(character, sort_keys=True).encode()).hexdigest()[:12]
+        if version == self.version:
+            return
+        self.snapshot = (version, character, system_prompt(character))
+        self.logger.info(f"loaded character {character.get('name')} version {version}")
+
+    def watch(self, kv: Red):
+        """Starts listening for broadcast characters if a loop is running and nothing listens on it yet."""
+        if time.monotonic() < self.retry_at:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        # a listener left on a loop that has since stopped doesn't count
+        if self.listener is not None and not self.listener.done() and self.listener.get_loop() is loop:
+            return
+        self.listener = loop.create_task(self.listen(kv))
+        self.listener.add_done_callback(self.stopped)
+
+    def stopped(self, task: asyncio.Task):
+        if self.listener is task:
+            self.listener = None
+
+    async def listen(self, kv: Red):
+        try:
+            pubsub = kv.red.pubsub()
+            await pubsub.subscribe(CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    self.swap(json.loads(message["data"]))
+                except ValueError as e:
+                    self.logger.error(f"keeping character {self.version}, ignored broadcast: {e}")
+        except Exception as e:
+            self.logger.error(f"stopped listening on {CHANNEL}: {e}")
+            self.retry_at = time.monotonic() + 30
+
+    @staticmethod
+    async def publish(kv: Red, character: dict):
+        """
+        Broadcasts a character to every process watching the channel.
+
+        Raises:
+            ValueError: If the character is invalid, nothing is sent
+        """
+        problems = validate(character)
+        if problems:
+            raise ValueError(f"invalid character: {', '.join(problems)}")
+        await kv.red.publish(CHANNEL, json.dumps(character))
@@ -2,99 +2,218 @@ import os
 import json
 import asyncio
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
 from engine.packages.log import Logger
 from engine.packages.mongo import MDB
 from engine.packages.red import Red
-from typing import Literal
+from engine.packages.metrics import Metrics
+from engine.agent.router import Router, MODEL
+from engine.agent.cache import ResponseCache
+from engine.agent.structured import StructuredOutput
+from engine.agent.character import CharacterStore
+from typing import Literal, Optional
 
 load_dotenv()
 
-URLS = {
-    "HYPERBOLIC": "https://api.hyperbolic.xyz/v1",
-    "GAIA": "https://llama8b.gaia.domains/v1",
-    "ORA": "https://api.ora.io/v1",
-}
-
 class AI:
-    def __init__(self, network: Literal["HYPERBOLIC", "GAIA", "ORA"] = "HYPERBOLIC"):
-        self.api_key = os.getenv(f"{network}_API_KEY")
-        self.base_url = f"{URLS[network]}"
-        self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+    def __init__(
+        self,
+        network: Literal["HYPERBOLIC", "GAIA", "ORA"] = "HYPERBOLIC",
+        qps: Optional[float] = None,
+        cache: bool = False,
+        hedge: Optional[bool] = None,
+        kv: Optional[Red] = None,
+    ):
+        # every configured provider is reachable, network is only the one preferred until latencies are known
+        hedge = os.getenv("LLM_HEDGE", "0") == "1" if hedge is None else hedge
+        self.router = Router(network, hedge=hedge, qps=qps)
         
         self.logger = Logger("agent", persist=True)
         self.mdb = MDB()
-        self.kv = Red()
+        self.kv = kv or Red()
+        
+        # completions are only cached when asked for, either here or per act() call
+        self.cache = ResponseCache(self.kv)
+        self.caching = cache
+        self.structured = StructuredOutput()
+        # JSONL file every valid completion is appended to, replayable by engine/scripts/stub.py
+        self.recording = os.getenv("LLM_RECORD")
         
-        with open("engine/agent/character/character.json") as f:
-            self.character = json.load(f)
+        # shared, hot reloaded character with its system prompt compiled once per version
+        self.characters = CharacterStore.get()
+    
+    @property
+    def character(self) -> dict:
+        return self.characters.character
     
     def _system(self):
         """
-        Builds the system prompt for the AI model based on character data.
+        Returns the system prompt for the AI model, compiled from the current character.
         
         Returns:
             str: The formatted system prompt
         """
-
-        prompt = f"""
-                YOU ARE {self.character["name"]},
-                YOUR BIO: {" ".join(self.character["bio"])}
-                YOUR PERSONALITY TRAITS: {", ".join(self.character["adjectives"])}
-                YOU KNOW ABOUT: {", ".join(self.character["topics"])}
-                COMMUNICATION STYLE: {(
-                    " ".join(self.character["style"]["all"])
-                    + " "
-                    + " ".join(self.character["style"]["chat"])
-                )}
-                
-                IMPORTANT: You MUST respond IN THE PROPER FORMAT GIVEN TO YOU.
-                
-                Keep your responses authentic to your character. Never break character.
-                """
-
-        return prompt
+        self.characters.watch(self.kv)
+        return self.characters.system
     
-    async def act(self, content: str):
+    async def act(self, content: str, key: Optional[str] = None, cache: Optional[bool] = None):
         """
         Sends a message to the NaderAI agent and returns a structured response
         
         Args:
             content (str): The user's message content
+            key (str, optional): Prompt key the content was built from, e.g. "testing"
+            cache (bool, optional): Overrides the instance caching setting for this call
             
         Returns:
             dict: The agent's response and action results
         """
         self.logger.info(f"processing agent action with content: {content[:50]}...")
         
+        system = self._system()
+        caching = self.caching if cache is None else cache
+        ckey = ResponseCache.key(MODEL, system, content) if caching else None
+        
         try:
-            response = await self.client.chat.completions.create(
+            output = await self.cache.get(ckey) if ckey else None
+            if ckey:
+                Metrics.inc("llm_cache_total", key=key or "unknown", result="hit" if output is not None else "miss")
+            if output is not None:
+                self.logger.info(f"cache hit for {key or 'agent action'}")
+                return {
+                    "status": "success",
+                    "response": self.structured.parse(output, key)[0]
+                }
+            
+            response = await self.router.complete(
                 messages=[
                     {
                         "role": "system",
-                        "content": self._system(),
+                        "content": system,
                     },
                     {
                         "role": "user",
                         "content": content,
                     },
                 ],
-                model="meta-llama/Meta-Llama-3.1-70B-Instruct",
+                key=key,
             )
             output = response.choices[0].message.content
             if not output: raise Exception("failed response from agent")
-            parsed = json.loads(output)
+            parsed, problems = self.structured.parse(output, key)
+            if problems:
+                parsed = await self.repair(content, output, problems, key)
+            if ckey: await self.cache.set(ckey, json.dumps(parsed), key)
+            if self.recording: self._record(key, json.dumps(parsed))
+            Metrics.inc("llm_actions_total", key=key or "unknown", outcome="success")
             return {
                 "status": "success",
                 "response": parsed
             }
         except Exception as error:
             self.logger.error(f"error processing agent action: {str(error)}")
+            Metrics.inc("llm_actions_total", key=key or "unknown", outcome="error")
             return {
                 "status": "error",
                 "response": "sorry, I encountered an error processing your request.",
             }
     
+    def _record(self, key: Optional[str], output: str):
+        with open(self.recording, "a") as f:
+            f.write(json.dumps({"key": key or "unknown", "output": output}) + "\n")
+    
+    async def repair(self, content: str, output: str, problems: list[str], key: Optional[str] = None):
+        """
+        Re-asks the agent once to fix a response that didn't parse or validate,
+        pointing at exactly what was wrong with it.
+        
+        Args:
+            content (str): The original message content
+            output (str): The agent's invalid response
+            problems (list[str]): What was wrong with it
+            key (str, optional): Prompt key the content was built from
+            
+        Returns:
+            dict: The repaired, validated response
+        """
+        self.structured.failed(key, problems, output)
+        
+        response = await self.router.complete(
+            messages=[
+                {
+                    "role": "system",
+                    "content": self._system(),
+                },
+                {
+                    "role": "user",
+                    "content": content,
+                },
+                {
+                    "role": "assistant",
+                    "content": output,
+                },
+                {
+                    "role": "user",
+                    "content": self.structured.repair(problems),
+                },
+            ],
+            key=key,
+        )
+        fixed = response.choices[0].message.content or ""
+        parsed, problems = self.structured.parse(fixed, key)
+        if problems:
+            self.structured.failed(key, problems, fixed)
+            raise Exception(f"invalid response for {key} after repair: {problems}")
+        
+        self.structured.repairs[key or "unknown"] += 1
+        Metrics.inc("llm_repairs_total", key=key or "unknown")
+        return parsed
+    
+    async def stream(self, content: str, key: Optional[str] = None):
+        """
+        Sends a message to the NaderAI agent and yields the completion as it is generated
+        
+        Args:
+            content (str): The user's message content
+            key (str, optional): Prompt key the content was built from, e.g. "ready"
+            
+        Yields:
+            str: Text deltas of the raw completion, in order
+            
+        Raises:
+            Exception: If no provider could stream the completion, or one failed partway
+                through it, leaving what was yielded truncated
+        """
+        self.logger.info(f"streaming agent action with content: {content[:50]}...")
+        
+        # streams can't be hedged, but until the first delta they fall back to the next ranked provider
+        messages = [
+            {
+                "role": "system",
+                "content": self._system(),
+            },
+            {
+                "role": "user",
+                "content": content,
+            },
+        ]
+        error = None
+        for provider in self.router.ranked():
+            yielded = False
+            try:
+                # the router records latency, tokens and the outcome once the stream ends
+                response = await self.router.call(provider, messages=messages, key=key, stream=True)
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yielded = True
+                        yield chunk.choices[0].delta.content
+                return
+            except Exception as e:
+                error = e
+                self.logger.error(f"error streaming agent action for {key or 'agent action'} on {provider.name}: {str(e)}")
+                # the caller already has part of this completion, another one can't continue it
+                if yielded: raise
+        raise error or Exception("no providers configured")
+    
 if __name__ == "__main__":
     async def main():
         agent = AI()
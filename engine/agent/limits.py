@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket limiting how many requests per second go out to a provider.
+    Limiters are shared per name so every AI instance in the process draws
+    from the same budget.
+    """
+
+    _limiters: dict[str, "RateLimiter"] = {}
+
+    def __init__(self, rate: float, burst: int | None = None):
+        """
+        Initialize the RateLimiter.
+
+        Args:
+            rate (float): Requests per second allowed on average.
+            burst (int, optional): Bucket size. Defaults to max(1, rate).
+        """
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    def get(cls, name: str, rate: float) -> "RateLimiter":
+        """
+        Returns the shared limiter for a name, creating it on first use.
+
+        Args:
+            name (str): Limiter name, usually the provider network.
+            rate (float): Requests per second if the limiter is created.
+
+        Returns:
+            RateLimiter: The shared limiter
+        """
+        if name not in cls._limiters:
+            cls._limiters[name] = cls(rate)
+        return cls._limiters[name]
+
+    async def acquire(self):
+        """Waits until a request slot is available and takes it."""
+        if self.rate <= 0:
+            return
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
@@ -0,0 +1,117 @@
+import math
+import os
+from typing import Literal
+from engine.packages.log import Logger
+
+# tokens a single prompt may use before sections start getting dropped
+BUDGET = int(os.getenv("PROMPT_BUDGET", "6000"))
+
+
+def tokens(text: str) -> int:
+    """
+    Estimates how many tokens a text uses. Llama tokenizers average a little
+    under four characters per token on english and code, so this errs high.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    return math.ceil(len(text) / 3.5)
+
+
+def truncate(text: str, limit: int) -> str:
+    """Cuts a text down to roughly limit tokens."""
+    if tokens(text) <= limit:
+        return text
+    return text[: int(limit * 3.5)].rstrip() + " ...[truncated]"
+
+
+class PromptBuilder:
+    """
+    Assembles a prompt under a token budget. Fixed parts are always kept, sections
+    are filled item by item in priority order (lowest first) until the budget runs
+    out, and everything is rendered back in the order it was added.
+    """
+
+    def __init__(self, budget: int = BUDGET):
+        """
+        Initialize the PromptBuilder.
+
+        Args:
+            budget (int, optional): Max tokens for the whole prompt. Defaults to BUDGET.
+        """
+        self.budget = budget
+        self.parts: list[dict] = []
+        self.dropped: dict[str, int] = {}
+        self.truncated: dict[str, int] = {}
+        self.logger = Logger("prompt", persist=True)
+
+    def fixed(self, text: str) -> "PromptBuilder":
+        """Adds text that is always part of the prompt."""
+        self.parts.append({"text": text})
+        return self
+
+    def section(
+        self,
+        label: str,
+        items: list[str],
+        priority: int,
+        cap: int | None = None,
+        keep: Literal["first", "last"] = "first",
+    ) -> "PromptBuilder":
+        """
+        Adds a list of items that only gets as much of the budget as is left.
+
+        Args:
+            label (str): Heading rendered above the items
+            items (list[str]): Items, in the order they should be rendered
+            priority (int): Lower priorities are filled first
+            cap (int, optional): Max tokens per item, longer items are truncated
+            keep (str, optional): Whether the "first" or "last" items survive when
+                the budget runs out. Defaults to "first".
+        """
+        self.parts.append({"label": label, "items": items, "priority": priority, "cap": cap, "keep": keep})
+        return self
+
+    def build(self) -> str:
+        """
+        Renders the prompt, recording in dropped and truncated what didn't fit.
+
+        Returns:
+            str: The assembled prompt
+        """
+        left = self.budget - sum(tokens(part["text"]) for part in self.parts if "text" in part)
+        chosen: dict[int, list[str]] = {}
+        self.dropped, self.truncated = {}, {}
+
+        sections = [(i, part) for i, part in enumerate(self.parts) if "items" in part]
+        for i, part in sorted(sections, key=lambda s: s[1]["priority"]):
+            label = part["label"]
+            left -= tokens(label) + 1
+            order = part["items"] if part["keep"] == "first" else list(reversed(part["items"]))
+            kept = []
+            for item in order:
+                if part["cap"] and tokens(item) > part["cap"]:
+                    item = truncate(item, part["cap"])
+                    self.truncated[label] = self.truncated.get(label, 0) + 1
+                cost = tokens(item) + 1
+                if cost > left:
+                    break
+                kept.append(item)
+                left -= cost
+            if len(kept) < len(order):
+                self.dropped[label] = len(order) - len(kept)
+            chosen[i] = kept if part["keep"] == "first" else list(reversed(kept))
+
+        if self.dropped:
+            self.logger.info(f"prompt over budget of {self.budget} tokens, dropped {self.dropped}")
+
+        rendered = []
+        for i, part in enumerate(self.parts):
+            if "text" in part:
+                rendered.append(part["text"])
+            elif chosen.get(i):
+                rendered.append(f"{part['label']}:\n" + "\n".join(chosen[i]))
+        return "\n".join(rendered)
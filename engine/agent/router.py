@@ -0,0 +1,283 @@
+import asyncio
+import os
+import time
+from collections import deque
+from openai import AsyncOpenAI
+from engine.agent.limits import RateLimiter
+from engine.packages.log import Logger
+from engine.packages.metrics import Metrics
+
+URLS = {
+    "HYPERBOLIC": "https://api.hyperbolic.xyz/v1",
+    "GAIA": "https://llama8b.gaia.domains/v1",
+    "ORA": "https://api.ora.io/v1",
+}
+
+MODEL = "meta-llama/Meta-Llama-3.1-70B-Instruct"
+
+# USD per million tokens, overridable with <NETWORK>_PRICE
+PRICES = {
+    "HYPERBOLIC": 0.40,
+    "GAIA": 0.0,
+    "ORA": 0.0,
+}
+
+# samples kept per provider for latency percentiles and error rates
+WINDOW = 50
+# a provider failing more than this share of its recent calls is skipped...
+MAX_ERROR_RATE = 0.5
+# ...until this many seconds have passed since its last failure
+COOLDOWN = 30.0
+# hedge delay used before a provider has any latency samples
+DEFAULT_HEDGE_DELAY = 3.0
+
+
+class Provider:
+    """One configured LLM endpoint and its rolling health statistics."""
+
+    _providers: dict[str, "Provider"] = {}
+
+    def __init__(self, name: str, qps: float | None = None):
+        self.name = name
+        self.base_url = os.getenv(f"{name}_BASE_URL") or URLS[name]
+        self.model = os.getenv(f"{name}_MODEL") or MODEL
+        self.price = float(os.getenv(f"{name}_PRICE") or PRICES[name])
+        self.client = AsyncOpenAI(api_key=os.getenv(f"{name}_API_KEY"), base_url=self.base_url)
+        self.limiter = RateLimiter.get(name, qps or float(os.getenv(f"{name}_QPS", "5")))
+        self.latencies: deque[float] = deque(maxlen=WINDOW)
+        self.outcomes: deque[bool] = deque(maxlen=WINDOW)
+        self.failed_at = 0.0
+
+    @classmethod
+    def get(cls, name: str, qps: float | None = None) -> "Provider":
+        """
+        Returns the shared provider for a name so health is tracked process wide.
+
+        Raises:
+            ValueError: If qps differs from the rate the shared provider was created with
+        """
+        if name not in cls._providers:
+            cls._providers[name] = cls(name, qps)
+        provider = cls._providers[name]
+        # the rate limit is shared too, a second rate would be silently ignored
+        if qps is not None and qps != provider.limiter.rate:
+            raise ValueError(f"{name} already limited to {provider.limiter.rate} qps, cannot use {qps}")
+        return provider
+
+    def record(self, ok: bool, latency: float | None = None):
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+        if not ok:
+            self.failed_at = time.monotonic()
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def healthy(self) -> bool:
+        return self.error_rate() <= MAX_ERROR_RATE or time.monotonic() - self.failed_at > COOLDOWN
+
+    def stats(self) -> dict:
+        return {
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "error_rate": self.error_rate(),
+            "healthy": self.healthy(),
+        }
+
+
+class Router:
+    """
+    Holds clients for every configured provider and sends each completion to the
+    fastest healthy one. With hedging on, a second request goes to the runner-up
+    once the first has taken longer than its p95, and whichever answers first wins.
+    """
+
+    def __init__(self, primary: str = "HYPERBOLIC", hedge: bool = False, qps: float | None = None):
+        """
+        Initialize the Router.
+
+        Args:
+            primary (str, optional): Provider preferred until latencies are known. Defaults to "HYPERBOLIC".
+            hedge (bool, optional): Whether to hedge slow requests. Defaults to False.
+            qps (float, optional): Requests per second for the primary provider, must match any rate
+                it was already given in this process.
+        """
+        self.logger = Logger("router", persist=True)
+        self.primary = primary
+        self.hedge = hedge
+        # providers without an api key are left out, the primary is always kept
+        self.providers = {
+            name: Provider.get(name, qps if name == primary else None)
+            for name in URLS
+            if name == primary or os.getenv(f"{name}_API_KEY")
+        }
+
+    def ranked(self) -> list[Provider]:
+        """
+        Orders providers by health and then median latency, unknown latencies
+        sorting right behind the primary.
+
+        Returns:
+            list[Provider]: Providers from best to worst
+        """
+        def score(provider: Provider):
+            p50 = provider.percentile(0.5)
+            return (
+                not provider.healthy(),
+                p50 if p50 is not None else (0.0 if provider.name == self.primary else float("inf")),
+                provider.name != self.primary,
+            )
+
+        return sorted(self.providers.values(), key=score)
+
+    async def call(self, provider: Provider, messages: list[dict], key: str | None = None, **kwargs):
+        """
+        Sends one completion request to a provider and records how it went.
+
+        Args:
+            provider (Provider): Provider to send to
+            messages (list[dict]): Chat messages
+            key (str, optional): Prompt key, used to label metrics
+
+        Returns:
+            The chat completion response. With stream=True, an async iterator of
+            chunks that records the call once the stream ends.
+        """
+        labels = {"provider": provider.name, "model": provider.model, "key": key or "unknown"}
+        if kwargs.get("stream"):
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        queued = time.monotonic()
+        await provider.limiter.acquire()
+        started = time.monotonic()
+        Metrics.observe("llm_queue_wait_seconds", started - queued, **labels)
+        try:
+            response = await provider.client.chat.completions.create(
+                messages=messages,
+                model=provider.model,
+                # lets recording proxies and the offline stub tell prompts apart
+                extra_headers={"X-Prompt-Key": key or "unknown"},
+                **kwargs,
+            )
+        except asyncio.CancelledError:
+            # a hedge loser's time so far is only a lower bound, it stays out of the latency window
+            Metrics.inc("llm_requests_total", outcome="cancelled", **labels)
+            raise
+        except Exception:
+            provider.record(False)
+            Metrics.inc("llm_requests_total", outcome="error", **labels)
+            raise
+        if kwargs.get("stream"):
+            return self._streamed(provider, response, started, labels)
+
+        latency = time.monotonic() - started
+        provider.record(True, latency)
+        Metrics.observe("llm_request_seconds", latency, **labels)
+        Metrics.inc("llm_requests_total", outcome="success", **labels)
+        self._usage(provider, getattr(response, "usage", None), labels)
+        return response
+
+    async def _streamed(self, provider: Provider, response, started: float, labels: dict):
+        """
+        Passes a stream's chunks through and records the call when it ends. A
+        stream's duration depends on how long the completion is, so it goes to
+        its own series and stays out of the latency window used for ranking and
+        hedging.
+        """
+        usage = None
+        try:
+            async for chunk in response:
+                # with include_usage, the last chunk carries the usage and no choices
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            Metrics.inc("llm_requests_total", outcome="cancelled", **labels)
+            raise
+        except Exception:
+            provider.record(False)
+            Metrics.inc("llm_requests_total", outcome="error", **labels)
+            raise
+        provider.record(True)
+        Metrics.observe("llm_stream_seconds", time.monotonic() - started, **labels)
+        Metrics.inc("llm_requests_total", outcome="success", **labels)
+        self._usage(provider, usage, labels)
+
+    def _usage(self, provider: Provider, usage, labels: dict):
+        if usage:
+            Metrics.inc("llm_tokens_total", usage.prompt_tokens, kind="prompt", **labels)
+            Metrics.inc("llm_tokens_total", usage.completion_tokens, kind="completion", **labels)
+            Metrics.inc("llm_cost_usd_total", usage.total_tokens * provider.price / 1_000_000, **labels)
+
+    async def complete(self, messages: list[dict], key: str | None = None, **kwargs):
+        """
+        Sends a completion to the best provider, hedging and falling back to the others.
+
+        Args:
+            messages (list[dict]): Chat messages
+            key (str, optional): Prompt key, used to label metrics
+
+        Returns:
+            The first successful chat completion response
+        """
+        ranked = self.ranked()
+        error = None
+        # a backup that already lost a hedge isn't asked again
+        tried: set[str] = set()
+
+        for provider in ranked:
+            if provider.name in tried:
+                continue
+            tried.add(provider.name)
+            backup = next((p for p in ranked if p.name not in tried), None) if self.hedge else None
+            try:
+                if backup is None:
+                    return await self.call(provider, messages, key, **kwargs)
+                return await self._hedged(provider, backup, messages, key, tried, **kwargs)
+            except Exception as e:
+                self.logger.error(f"completion failed on {provider.name}: {e}")
+                error = e
+
+        raise error or Exception("no providers configured")
+
+    async def _hedged(
+        self,
+        provider: Provider,
+        backup: Provider,
+        messages: list[dict],
+        key: str | None,
+        tried: set[str],
+        **kwargs,
+    ):
+        delay = provider.percentile(0.95) or DEFAULT_HEDGE_DELAY
+        first = asyncio.create_task(self.call(provider, messages, key, **kwargs))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.logger.info(f"{provider.name} slower than {delay:.2f}s, hedging on {backup.name}")
+        Metrics.inc("llm_hedges_total", provider=provider.name, backup=backup.name, key=key or "unknown")
+        tried.add(backup.name)
+        second = asyncio.create_task(self.call(backup, messages, key, **kwargs))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # both failed, surface the primary's error so the caller falls back
+            raise first.exception() or second.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {name: provider.stats() for name, provider in self.providers.items()}
@@ -0,0 +1,49 @@
+import re
+from typing import Optional
+
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def partial_field(buffer: str, field: str = "message") -> Optional[str]:
+    """
+    Reads a string field out of a JSON object that is still being streamed.
+
+    Args:
+        buffer (str): The completion text received so far
+        field (str, optional): Name of the string field. Defaults to "message".
+
+    Returns:
+        Optional[str]: The field's value decoded so far, or None if it hasn't started
+    """
+    match = re.search(rf'"{re.escape(field)}"\s*:\s*"', buffer)
+    if not match:
+        return None
+
+    out = []
+    i = match.end()
+    while i < len(buffer):
+        char = buffer[i]
+        if char == '"':
+            break
+        if char != "\\":
+            out.append(char)
+            i += 1
+            continue
+        # stop at an escape sequence that hasn't fully arrived yet
+        if i + 1 >= len(buffer):
+            break
+        code = buffer[i + 1]
+        if code == "u":
+            digits = buffer[i + 2:i + 6]
+            if len(digits) < 4:
+                break
+            try:
+                out.append(chr(int(digits, 16)))
+            except ValueError:
+                pass
+            i += 6
+            continue
+        out.append(ESCAPES.get(code, code))
+        i += 2
+
+    return "".join(out)
@@ -0,0 +1,221 @@
+import json
+import re
+from collections import Counter
+from typing import Any, Optional
+from engine.packages.log import Logger
+from engine.packages.metrics import Metrics
+
+# expected fields per prompt key: field -> (type, required)
+# types are "str", "int", "bool", "dict", "list", "list[str]", "any", a tuple of allowed
+# values, or a nested schema for an object
+SCHEMAS: dict[str, dict[str, tuple[Any, bool]]] = {
+    "gather": {"message": ("str", True)},
+    "reffered": {"message": ("str", True)},
+    "inquire": {"message": ("str", True), "action": (("pass", "stay"), False)},
+    "gathering": {
+        "message": ("str", True),
+        "extracted": ({"github": ("str", False), "email": ("str", False), "soft": ("list[str]", False), "hard": ("list[str]", False)}, False),
+    },
+    "ready": {"message": ("str", True)},
+    "job_match": {"message": ("str", True), "provide_link": ("bool", False)},
+    "job_match_evaluation": {"match_found": ("bool", True), "job_id": ("any", False), "match_reason": ("str", False)},
+    "extract_info": {"github_username": ("str", False), "email": ("str", False), "confidence": ("any", False)},
+    "testing": {"fit_score": ("int", True), "comments": ("str", False)},
+    "summary": {"summary": ("str", True)},
+}
+
+REPAIR = (
+    "Your last reply could not be used: {problems}. "
+    "Reply again with ONLY the corrected JSON object in the format you were given, nothing else."
+)
+
+
+def loads(text: str) -> Any:
+    """
+    Parses JSON out of a completion, tolerating markdown fences, text around the
+    object, // comments, trailing commas and objects cut off before they closed.
+
+    Args:
+        text (str): The raw completion
+
+    Returns:
+        Any: The parsed value
+
+    Raises:
+        ValueError: If no JSON could be recovered
+    """
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    fenced = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("no JSON object in response")
+    end = text.rfind("}")
+    candidate = text[start:end + 1] if end > start else text[start:]
+
+    for attempt in (candidate, _close(candidate)):
+        cleaned = _clean(attempt)
+        try:
+            return json.loads(cleaned)
+        except ValueError:
+            continue
+    raise ValueError("unparseable JSON object in response")
+
+
+def _clean(text: str) -> str:
+    # drop // comments outside of strings, then trailing commas
+    out, in_string, escaped, i = [], False, False, 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif text.startswith("//", i):
+            while i < len(text) and text[i] != "\n":
+                i += 1
+            continue
+        else:
+            out.append(char)
+        i += 1
+    return re.sub(r",\s*([}\]])", r"\1", "".join(out))
+
+
+def _close(text: str) -> str:
+    # closes strings, arrays and objects left open by a truncated completion
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    closed = text.rstrip().rstrip(",:") if not in_string else text + '"'
+    return closed + "".join(reversed(stack))
+
+
+def _coerce(value: Any, kind: Any) -> tuple[Any, bool]:
+    if isinstance(kind, tuple):
+        value = value.strip().lower() if isinstance(value, str) else value
+        return value, value in kind
+    if kind == "any":
+        return value, True
+    if kind == "str":
+        if isinstance(value, str) and value.strip().lower() in ("null", "none", ""):
+            return None, True
+        return value, isinstance(value, str)
+    if kind == "int":
+        if isinstance(value, bool):
+            return value, False
+        if isinstance(value, (int, float)):
+            return int(value), True
+        match = re.search(r"-?\d+", value) if isinstance(value, str) else None
+        return (int(match.group()), True) if match else (value, False)
+    if kind == "bool":
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true", True
+        return value, isinstance(value, bool)
+    if kind == "dict":
+        return value, isinstance(value, dict)
+    if kind == "list":
+        return value, isinstance(value, list)
+    if kind == "list[str]":
+        return value, isinstance(value, list) and all(isinstance(item, str) for item in value)
+    return value, True
+
+
+def _describe(kind: Any) -> str:
+    if isinstance(kind, tuple):
+        return " or ".join(kind)
+    if isinstance(kind, dict):
+        return "an object"
+    return kind
+
+
+def _validate(data: dict, schema: dict, prefix: str = "") -> list[str]:
+    # coerces data's fields in place, nested schemas included, and returns what's wrong
+    problems = []
+    for field, (kind, required) in schema.items():
+        name = f"{prefix}{field}"
+        if data.get(field) is None:
+            if required:
+                problems.append(f'missing field "{name}"')
+            continue
+        if isinstance(kind, dict):
+            if isinstance(data[field], dict):
+                problems.extend(_validate(data[field], kind, f"{name}."))
+                continue
+            ok = False
+        else:
+            data[field], ok = _coerce(data[field], kind)
+        if not ok:
+            problems.append(f'field "{name}" should be {_describe(kind)}')
+    return problems
+
+
+class StructuredOutput:
+    """
+    Turns completions into validated dicts for a prompt key and counts how often
+    each prompt's output needed fixing.
+    """
+
+    def __init__(self):
+        self.logger = Logger("structured", persist=True)
+        self.failures: Counter[str] = Counter()
+        self.repairs: Counter[str] = Counter()
+
+    def parse(self, text: str, key: Optional[str] = None) -> tuple[Any, list[str]]:
+        """
+        Parses and validates a completion against the schema of its prompt key.
+
+        Args:
+            text (str): The raw completion
+            key (str, optional): Prompt key the completion answers
+
+        Returns:
+            tuple[Any, list[str]]: The parsed (and coerced) data, and a list of problems.
+                Keys without a schema may be answered in plain text, which is returned as is.
+        """
+        schema = SCHEMAS.get(key or "")
+        try:
+            data = loads(text)
+        except ValueError as e:
+            if schema is None:
+                return text.strip(), []
+            return None, [str(e)]
+
+        if schema is None:
+            return data, []
+        if not isinstance(data, dict):
+            return data, ["response is not a JSON object"]
+
+        return data, _validate(data, schema)
+
+    def failed(self, key: Optional[str], problems: list[str], text: str):
+        self.failures[key or "unknown"] += 1
+        Metrics.inc("llm_parse_failures_total", key=key or "unknown")
+        self.logger.error(f"invalid response for {key}: {problems}. Response: {text[:200]}")
+
+    def repair(self, problems: list[str]) -> str:
+        return REPAIR.format(problems="; ".join(problems))
@@ -0,0 +1,126 @@
+import asyncio
+import textwrap
+from datetime import datetime
+from typing import Optional
+from engine.agent.index import AI
+from engine.packages.log import Logger
+from engine.packages.mongo import MDB
+
+# unsummarized messages (beyond the recent window) that trigger a summary update
+BATCH = 10
+
+prompts = {
+    "summary": textwrap.dedent("""
+        You keep a running summary of your conversation with a candidate for your network.
+        You are given the summary so far and the messages exchanged since it was written.
+        Update the summary so it covers everything, without repeating yourself.
+
+        KEEP:
+        - who they are, what they build, their skills and interests
+        - anything they shared like github, email, projects, companies
+        - promises you made, open questions, and how the conversation has felt
+
+        Keep it under 200 words, plain sentences, no lists.
+
+        SUMMARY SO FAR:
+        {summary}
+
+        NEW MESSAGES:
+        {messages}
+
+        DO NOT DEVIATE
+        YOU MUST RESPOND IN JSON FORMAT OF:
+        {{
+            "summary": "the updated summary"
+        }}
+    """),
+}
+
+
+class Summarizer:
+    """
+    Keeps a compact rolling summary of each Telegram conversation on the person's
+    document, folding in archived messages in batches as they fall out of the
+    recent window that prompts carry verbatim.
+    """
+
+    def __init__(self, ai: AI, mdb: MDB, keep: int = 10, batch: int = BATCH, limit: Optional[asyncio.Semaphore] = None):
+        """
+        Initialize the Summarizer.
+
+        Args:
+            ai (AI): Agent used to write the summaries
+            mdb (MDB): Connected database client
+            keep (int, optional): Latest messages that are never summarized. Defaults to 10.
+            batch (int, optional): Unsummarized messages needed before an update. Defaults to BATCH.
+            limit (asyncio.Semaphore, optional): Slots for LLM calls shared with the caller
+        """
+        self.ai = ai
+        self.mdb = mdb
+        self.keep = keep
+        self.batch = batch
+        self.limit = limit or asyncio.Semaphore(1)
+        self.logger = Logger("summary", persist=True)
+        self.running: dict[str, asyncio.Task] = {}
+
+    def schedule(self, telegram_username: str):
+        """Starts a background update for a user unless one is already running."""
+        if telegram_username in self.running:
+            return
+        task = asyncio.create_task(self.update(telegram_username))
+        self.running[telegram_username] = task
+        task.add_done_callback(lambda _: self.running.pop(telegram_username, None))
+
+    async def update(self, telegram_username: str):
+        """
+        Folds a user's unsummarized messages into their summary once enough have piled up.
+
+        Args:
+            telegram_username (str): The user's telegram username
+        """
+        if self.mdb.client is None:
+            return
+
+        people = self.mdb.client["network"]["people"]
+
+        try:
+            head = await self.mdb.run(lambda: next(people.aggregate([
+                {"$match": {"telegram_username": telegram_username}},
+                {"$project": {"summary": 1, "count": {"$size": {"$ifNull": ["$messages", []]}}}},
+            ]), None))
+            if not head:
+                return
+
+            summary = head.get("summary") or {}
+            covered = summary.get("covered", 0)
+            upto = head["count"] - self.keep
+            if upto - covered < self.batch:
+                return
+
+            # an inclusion projection so only the batch comes back, not the rest of the document
+            person = await self.mdb.run(lambda: next(people.aggregate([
+                {"$match": {"_id": head["_id"]}},
+                {"$project": {"messages": {"$slice": [{"$ifNull": ["$messages", []]}, covered, upto - covered]}}},
+            ]), None))
+            new = (person or {}).get("messages") or []
+            formatted = "\n".join(f"{m.get('author')}: {m.get('message')}" for m in new)
+
+            async with self.limit:
+                res = await self.ai.act(
+                    prompts["summary"].format(summary=summary.get("text") or "nothing yet", messages=formatted),
+                    key="summary",
+                )
+            text = res["response"].get("summary") if isinstance(res["response"], dict) else None
+            if not text:
+                self.logger.error(f"failed to summarize conversation with {telegram_username}: {res['response']}")
+                return
+
+            # only lands if nobody else moved the summary on in the meantime
+            await self.mdb.run(
+                people.update_one,
+                {"_id": head["_id"], "summary.covered": summary.get("covered", {"$exists": False})},
+                {"$set": {"summary": {"text": text, "covered": covered + len(new), "updated_at": datetime.now()}}},
+            )
+            self.logger.info(f"summarized {len(new)} messages for {telegram_username}")
+        except Exception as e:
+            self.logger.error(f"error summarizing conversation with {telegram_username}: {e}")
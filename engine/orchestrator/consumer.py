@@ -0,0 +1,55 @@
+import asyncio
+import os
+import signal
+import socket
+from engine.orchestrator.orchestrator import Orchestrator, WORKERS
+from engine.orchestrator.work import WorkQueue
+from engine.packages.log import Logger
+from engine.packages.metrics import Metrics
+
+logger = Logger("consumer", persist=True)
+
+
+async def main():
+    """
+    Worker process running queued stage work items. Start as many as needed
+    next to one orchestrator running with WORK_QUEUE=1, which only discovers
+    people and queues them.
+    """
+    orchestrator = Orchestrator()
+    if os.getenv("METRICS_PORT"):
+        Metrics.serve(int(os.getenv("METRICS_PORT") or 0))
+
+    await orchestrator.twtw.login(
+        username=os.getenv("TWITTER_USERNAME"),
+        email=os.getenv("TWITTER_EMAIL"),
+        password=os.getenv("TWITTER_PASSWORD"),
+    )
+
+    queue = orchestrator.queue or WorkQueue(orchestrator.kv)
+    consumer = os.getenv("CONSUMER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    # workers finish the item in hand, unacked ones are reclaimed by other consumers
+    try:
+        await queue.consume(
+            consumer,
+            orchestrator.process,
+            dead=orchestrator.dead,
+            concurrency=int(os.getenv("CONSUMER_CONCURRENCY", WORKERS)),
+            stop=stop,
+        )
+    finally:
+        await orchestrator.writes.close()
+    logger.info(f"{consumer} stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+from bson import json_util
+from pymongo.errors import OperationFailure, PyMongoError
+from engine.packages.log import Logger
+from engine.packages.red import Red
+
+# redis key holding the resume token of the last dispatched event
+RESUME_KEY = "orchestrator:resume_token"
+# seconds to wait before reopening a failed change stream
+RETRY = 30
+# change stream errors meaning the resume token is no longer in the oplog
+HISTORY_LOST = (136, 280, 286)
+
+# new people and state changes, other updates (gather_attempts, dm, ...) are filtered server side
+PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": {"$in": ["insert", "replace"]}},
+        {"operationType": "update", "updateDescription.updatedFields.state": {"$exists": True}},
+    ]}},
+    # handlers claim the person and load what they need, the event only has to route
+    {"$project": {"operationType": 1, "fullDocument._id": 1, "fullDocument.state": 1, "fullDocument.x_username": 1}},
+]
+
+
+class ChangeFeed:
+    """
+    Watches network.people through a change stream and runs the stage handler
+    for a person's new state as soon as it changes, instead of waiting for the
+    next polling pass. The resume token is persisted in redis so a restart picks
+    up where it left off, and the periodic stages stay on as a safety sweep for
+    anything missed while the stream was down.
+    """
+
+    def __init__(
+        self,
+        collection,
+        kv: Red,
+        handlers: dict[str, Callable[[dict], Awaitable]],
+        guard: Callable[[str, dict, Callable], Awaitable],
+        concurrency: int = 8,
+    ):
+        """
+        Initialize the ChangeFeed.
+
+        Args:
+            collection (Collection): The network.people collection
+            kv (Red): Redis client used to persist the resume token
+            handlers (dict): Per-person stage handler by state
+            guard (Callable): Runs a handler for a person, skipping people already in flight
+                and recording failures, see Orchestrator.guard
+            concurrency (int, optional): Max handlers in flight. Defaults to 8.
+        """
+        self.logger = Logger("changefeed", persist=True)
+        self.collection = collection
+        self.kv = kv
+        self.handlers = handlers
+        self.guard = guard
+        self.slots = asyncio.Semaphore(concurrency)
+        self.tasks: set[asyncio.Task] = set()
+        self.dispatched = 0
+
+    async def token(self) -> Optional[dict]:
+        raw = await self.kv.red.get(RESUME_KEY)
+        return json_util.loads(raw) if raw else None
+
+    async def run(self):
+        """Dispatches events until cancelled, reopening the stream after errors."""
+        while True:
+            try:
+                await self.follow(await self.token())
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in HISTORY_LOST:
+                    # the sweep covers whatever happened in between
+                    self.logger.error(f"resume token expired, starting from now: {e}")
+                    await self.kv.red.delete(RESUME_KEY)
+                    continue
+                self.logger.error(f"change stream failed: {e}")
+                await asyncio.sleep(RETRY)
+            except (PyMongoError, OSError) as e:
+                self.logger.error(f"change stream failed: {e}")
+                await asyncio.sleep(RETRY)
+
+    async def follow(self, resume: Optional[dict]):
+        stream = await asyncio.to_thread(
+            self.collection.watch,
+            PIPELINE,
+            full_document="updateLookup",
+            resume_after=resume,
+            max_await_time_ms=1000,
+        )
+        self.logger.info(f"watching people {'from saved token' if resume else 'from now'}")
+        try:
+            while True:
+                event = await asyncio.to_thread(stream.try_next)
+                if event is None:
+                    continue
+                await self.dispatch(event)
+                await self.kv.red.set(RESUME_KEY, json_util.dumps(event["_id"]))
+        finally:
+            await asyncio.to_thread(stream.close)
+
+    async def dispatch(self, event: dict):
+        person = event.get("fullDocument")
+        # deleted since, or a state with nothing to run right away
+        if not person or person.get("state") not in self.handlers:
+            return
+        state = person["state"]
+        await self.slots.acquire()
+        self.dispatched += 1
+        self.logger.info(f"{event['operationType']} put {person.get('x_username')} in {state}, dispatching")
+
+        task = asyncio.create_task(self.handle(state, person))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def handle(self, state: str, person: dict):
+        try:
+            await self.guard(state, person, self.handlers[state])
+        finally:
+            self.slots.release()
@@ -1,5 +1,5 @@
 import asyncio
-import schedule
+import hashlib
 import time
 import os
 import dotenv
@@ -10,19 +10,71 @@ from telegram.ext import Application, CommandHandler, MessageHandler, filters, C
 
 from engine.packages.github import GithubWorker
 from engine.packages.worker import TWTW
+from engine.orchestrator.scheduler import Scheduler
+from engine.orchestrator.events import ChangeFeed
+from engine.orchestrator.work import Busy, WorkQueue
 
 dotenv.load_dotenv()
 
 from engine.agent.index import AI
+from engine.agent.prompt import PromptBuilder
 from engine.packages.log import Logger
 from engine.packages.mongo import MDB
 from engine.packages.red import Red
+from engine.packages.metrics import Metrics
 from engine.packages.telegram import TEL
+from engine.packages.states import StateMachine, owner
+from engine.packages.batch import WriteBatcher
+from engine.packages import indexes
 from twikit.errors import Forbidden
+from bson import ObjectId
 from datetime import datetime
 
 states = ["seed", "gathering", "testing", "pre_referral"]
 
+# max tokens of a single README in the testing prompt
+README_TOKENS = 400
+
+# people processed at once within a stage pass
+WORKERS = int(os.getenv("STAGE_WORKERS", 8))
+# calls in flight at once per external service, shared by every stage
+LIMITS = {
+    "twitter": int(os.getenv("TWITTER_CONCURRENCY", 2)),
+    "github": int(os.getenv("GITHUB_CONCURRENCY", 4)),
+    "llm": int(os.getenv("LLM_CONCURRENCY", 8)),
+}
+
+# fields each stage handler reads, claims load only these
+FIELDS = {
+    "seed": {"x_username": 1, "x_name": 1, "x_bio": 1, "tweets": 1},
+    "gathering": {
+        "x_username": 1, "github_username": 1, "email": 1, "referrer": 1,
+        "gather_attempts": 1, "dm": 1, "dm_cursor": 1,
+    },
+    "testing": {"x_username": 1, "github_username": 1, "github_evaluation": 1},
+}
+
+# older DM pages read per pass while catching up to a person's cursor
+SYNC_PAGES = 5
+# seconds without a reply before an idle candidate gets another gathering message
+NUDGE_AFTER = float(os.getenv("GATHER_NUDGE_AFTER", 24 * 60 * 60))
+
+
+def snapshot(repos: list[dict]) -> str:
+    """
+    Hash of what a candidate's fit evaluation depends on. Stars aren't part of
+    it, only a push or a renamed/re-described repo warrants scoring again.
+
+    Args:
+        repos (list[dict]): Repositories as returned by GithubWorker.get_user_repositories
+
+    Returns:
+        str: Hex sha256 of the repositories, independent of their order
+    """
+    content = sorted((repo["name"], repo.get("description") or "", repo.get("pushed_at") or "") for repo in repos)
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+
 prompts = {
     "seed": textwrap.dedent("""
         OVERVIEW:
@@ -56,6 +108,11 @@ prompts = {
         3. Be friendly and professional
         4. Do not mention that you're an AI
         5. Don't be robotic or overly formal
+
+        YOU MUST FORMAT your response as a JSON object with this field:
+        {{
+            "message": "your message to them"
+        }}
         """),
     "extract_info": textwrap.dedent("""
         TASK: Extract GitHub username and email from the conversation, if present.
@@ -68,11 +125,11 @@ prompts = {
         2. Email address
         
         YOU MUST FORMAT your response as a JSON object with these fields:
-        {
+        {{
             "github_username": "extracted username or null if not found",
             "email": "extracted email or null if not found",
             "confidence": "high/medium/low for each extraction"
-        }
+        }}
         
         Only extract information that is clearly provided by the user. Do not guess or assume information.
     """),
@@ -139,73 +196,225 @@ prompts = {
 }
 
 class Orchestrator:
-    def __init__(self):
+    def __init__(self, mdb=None, kv=None, twtw=None, ai=None, tel=None, git=None):
+        """
+        Initialize the Orchestrator. Every dependency is built from the
+        environment unless passed in, as engine/scripts/simulate.py does with fakes.
+        """
         self.logger = Logger("orchestrator", persist=True)
-        self.mdb = MDB()
+        self.mdb = mdb or MDB()
         self.mdb.connect()
-        self.kv = Red()
-        self.twtw = TWTW()
-        self.ai = AI()
-        self.tel = TEL()
-        self.git = GithubWorker()
+        indexes.ensure(self.mdb)
+        self.kv = kv or Red()
+        self.twtw = twtw or TWTW()
+        self.ai = ai or AI()
+        self.tel = tel or TEL()
+        self.git = git or GithubWorker()
+        self.limits = {service: asyncio.Semaphore(limit) for service, limit in LIMITS.items()}
+        # stage results are merged per person and written in bulk
+        self.writes = WriteBatcher(
+            self.mdb.client["network"]["people"],
+            size=int(os.getenv("WRITE_BATCH_SIZE", 100)),
+            interval=float(os.getenv("WRITE_BATCH_INTERVAL", 1.0)),
+            on_error=self.write_failed,
+        )
+        # people are claimed before a handler runs, so replicas never process the same one
+        self.states = StateMachine(self.mdb, owner=owner(), batch=self.writes)
+        self.handlers = {"seed": self.seed, "gathering": self.gather_person, "testing": self.test_person}
+        # with WORK_QUEUE=1 stage passes only queue people and consumer processes run the handlers
+        self.queue = WorkQueue(self.kv) if os.getenv("WORK_QUEUE", "0") == "1" else None
 
     async def prompt(self, key, details):
         base = prompts[key]
         return f"{base}\n{details}"
 
+    async def fan(self, stage, people, handler):
+        """
+        Runs a per-person handler over a cursor with a bounded pool of workers.
+        A failure for one person is written to their issue / error fields and
+        doesn't stop the rest of the pass.
+
+        Args:
+            stage (str): Stage name, for logging
+            people (Iterable[dict]): People to process, usually a pymongo cursor
+            handler (Callable): Coroutine function taking one person
+        """
+        # one shared iterator, workers only pull the next person between awaits
+        cursor = iter(people)
+        handled = 0
+
+        async def worker():
+            nonlocal handled
+            for person in cursor:
+                handled += 1
+                await self.guard(stage, person, handler)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(WORKERS)))
+        self.logger.info(f"{stage} processed {handled} people in {time.monotonic() - started:.1f}s")
+
+    async def guard(self, stage, person, handler):
+        """Claims a person and runs a per-person handler, writing a failure to the person's issue / error fields."""
+        # moved on or being processed by another worker
+        person = await self.states.claim(person["_id"], stage, projection=FIELDS[stage])
+        if person is None:
+            return
+        try:
+            await handler(person)
+        except Exception as e:
+            self.logger.error(f"error processing {stage} for {person.get('x_username')}: {e}")
+            await self.fail(person, e)
+        finally:
+            await self.states.release(person["_id"])
+
+    async def fail(self, person, e):
+        # written under the claim and dropping it, so the release that follows is a no-op
+        issue = "twitter_forbidden" if isinstance(e, Forbidden) else "error"
+        await self.writes.add(
+            {"_id": person["_id"], "lease.owner": self.states.owner},
+            {"$set": {"issue": issue, "error": str(e)}, "$unset": {"lease": ""}},
+        )
+        self.logger.info(f"updated issue & error for {person.get('x_username')} to {issue}")
+
+    async def write_failed(self, person_id, error):
+        """Records a failed batched write on the person, written directly so it can't fail along with the batch."""
+        try:
+            await self.mdb.run(
+                self.writes.collection.update_one,
+                {"_id": person_id},
+                {"$set": {"issue": "error", "error": f"failed to write: {error}"}},
+            )
+        except Exception as e:
+            self.logger.error(f"error recording failed write for {person_id}: {e}")
+
+    async def dispatch(self, state, people):
+        """
+        Hands people in a state to their stage handler, in this process or
+        through the work queue when one is configured.
+
+        Args:
+            state (str): State whose handler should run
+            people (Iterable[dict]): People in that state
+        """
+        if self.queue is None:
+            await self.fan(state, people, self.handlers[state])
+            await self.writes.flush()
+            return
+
+        queued = 0
+        for person in people:
+            queued += await self.queue.publish(person["_id"], state) is not None
+        self.logger.info(f"queued {queued} people for {state}")
+
+    async def process(self, stage, person_id):
+        """
+        Runs a stage for one queued person, see WorkQueue.consume. Raises to have
+        the item retried, except for Forbidden which retrying won't fix, and
+        raises Busy while someone else still holds the person's lease.
+
+        Args:
+            stage (str): State whose handler should run
+            person_id (str): The person's _id
+        """
+        person = await self.states.claim(ObjectId(person_id), stage, projection=FIELDS[stage])
+        if person is None:
+            # moved on since it was queued, nothing left to do
+            if await self.mdb.run(self.states.people.find_one, {"_id": ObjectId(person_id), "state": stage}, {"_id": 1}) is None:
+                return
+            # still leased, by another worker or a release that hasn't landed yet
+            raise Busy(f"{person_id} is claimed")
+
+        try:
+            await self.handlers[stage](person)
+        except Forbidden as fe:
+            self.logger.error(f"Twitter API Forbidden error: {fe}")
+            await self.fail(person, fe)
+        finally:
+            await self.states.release(person["_id"])
+
+    async def dead(self, stage, person_id, error):
+        """Records a work item that ran out of retries on the person."""
+        await self.writes.add({"_id": ObjectId(person_id)}, {"$set": {"issue": "error", "error": error}})
+        self.logger.info(f"updated issue & error for {person_id} to error after retries ran out for {stage}")
+
+    async def watch(self):
+        """Runs stage handlers off the people change stream until cancelled."""
+        if not self.mdb.client: return
+
+        # gathering waits on the candidate's reply, so it's left to the periodic pass
+        states = ["seed", "testing"]
+        if self.queue is None:
+            handlers, guard = {state: self.handlers[state] for state in states}, self.guard
+        else:
+            # consumers claim people themselves, a claim here would still be held when they get the item
+            handlers, guard = {state: self.enqueue for state in states}, self.enqueue
+
+        feed = ChangeFeed(
+            self.mdb.client["network"]["people"],
+            self.kv,
+            handlers=handlers,
+            guard=guard,
+            concurrency=WORKERS,
+        )
+        await feed.run()
+
+    async def enqueue(self, state, person, handler=None):
+        """Queues a person the change feed saw for a consumer, in place of guard and a handler."""
+        try:
+            await self.queue.publish(person["_id"], state)
+        except Exception as e:
+            self.logger.error(f"error queueing {state} for {person.get('x_username')}: {e}")
+
+    async def github(self, method, *args):
+        """Runs a blocking GithubWorker method in a thread, within the github limit."""
+        async with self.limits["github"]:
+            return await asyncio.to_thread(method, *args)
+
     async def seeds(self):
         self.logger.info("processing seeds")
 
         if not self.mdb.client: return
 
         people = self.mdb.client["network"]["people"]
-        for person in people.find({"state": "seed"}):
-            self.logger.info(f"processing {person.get('x_username')}")
-            
-            extra = textwrap.dedent(f"""
-                DETAILS ABOUT THE POTENTIAL CANDIDATE:
-                - CANDIDATES Twitter / X Username: {person.get("x_username")}
-                - CANDIDATES Twitter / X Name: {person.get("x_name")}
-                - CANDIDATES Twitter / X Bio: {person.get("x_bio")}
-                - CANDIDATES Last Couple Of Tweets List: {person.get("tweets")}
-            """)
-            
-            try:
-                full = await self.prompt("seed", extra)
-                opener = await self.ai.act(full)
-                msg = opener["response"]
-                self.logger.info(f"opening message: {msg}")
-                
-                # xusrid = str(await self.twtw.uid(person.get("x_username")))
-                # print(xusrid)
-                # dm = await self.twtw.client.send_dm(user_id=xusrid, text=msg)
-                # self.logger.info(f"sent opening message to {person.get('x_username')}")
-                # people.update_one({"_id": person["_id"]}, {"$set": {"state": "gathering"}})
-                # self.logger.info(f"updated state for {person.get('x_username')} to gathering")
-                # people.update_one(
-                #     {"_id": person["_id"]},
-                #     {
-                #         "$push": {
-                #             "dm": {
-                #                 "timestamp": datetime.now(),
-                #                 "content": dm.text,
-                #                 "id": dm.id,
-                #                 "sender": "naderai",
-                #             }
-                #         }
-                #     }
-                # )
-                # self.logger.info(f"updated dm [] for {person.get('x_username')}")
-                
-            except Forbidden as fe:
-                self.logger.error(f"Twitter API Forbidden error: {fe}")
-                people.update_one({"_id": person["_id"]}, {"$set": {"issue": "twitter_forbidden", "error": str(fe)}})
-                self.logger.info(f"updated issue & error for {person.get('x_username')} to twitter_forbidden")
-                
-            except Exception as e:
-                self.logger.error(f"error processing {person.get('x_username')}: {e}")
-                people.update_one({"_id": person["_id"]}, {"$set": {"issue": "error", "error": str(e)}})
-                self.logger.info(f"updated issue & error for {person.get('x_username')} to error")
+        await self.dispatch("seed", people.find({"state": "seed"}, {"_id": 1}))
+
+    async def seed(self, person):
+        self.logger.info(f"processing {person.get('x_username')}")
+        
+        extra = textwrap.dedent(f"""
+            DETAILS ABOUT THE POTENTIAL CANDIDATE:
+            - CANDIDATES Twitter / X Username: {person.get("x_username")}
+            - CANDIDATES Twitter / X Name: {person.get("x_name")}
+            - CANDIDATES Twitter / X Bio: {person.get("x_bio")}
+            - CANDIDATES Last Couple Of Tweets List: {person.get("tweets")}
+        """)
+        
+        full = await self.prompt("seed", extra)
+        async with self.limits["llm"]:
+            opener = await self.ai.act(full, key="seed")
+        msg = opener["response"]
+        self.logger.info(f"opening message: {msg}")
+        
+        # async with self.limits["twitter"]:
+        #     xusrid = str(await self.twtw.uid(person.get("x_username")))
+        #     dm = await self.twtw.client.send_dm(user_id=xusrid, text=msg)
+        # self.logger.info(f"sent opening message to {person.get('x_username')}")
+        # await self.states.move({"_id": person["_id"]}, "seed", "gathering")
+        # self.logger.info(f"updated state for {person.get('x_username')} to gathering")
+        # people.update_one(
+        #     {"_id": person["_id"]},
+        #     {
+        #         "$push": {
+        #             "dm": {
+        #                 "timestamp": datetime.now(),
+        #                 "content": dm.text,
+        #                 "id": dm.id,
+        #                 "sender": "naderai",
+        #             }
+        #         }
+        #     }
+        # )
+        # self.logger.info(f"updated dm [] for {person.get('x_username')}")
             
     async def xgather(self):
         self.logger.info("gathering data")
@@ -215,127 +424,185 @@ class Orchestrator:
         people = self.mdb.client["network"]["people"]
         
         # Process people in "gathering" states
-        for person in people.find({"state": {"$in": ["gathering"]}}):
-            x_username = person.get("x_username")
-            self.logger.info(f"gathering info for {x_username}")
-            
-            try:
-                # Get user ID from username
-                user_id = str(await self.twtw.uid(x_username))
-                
-                # Get previous messages from DM history
-                message_history = await self.twtw.client.get_dm_history(user_id)
-                previous_messages = []
-                
-                # Format previous messages for the prompt
-                for message in message_history:
-                    sender = "them" if message.sender_id == user_id else "you"
-                    previous_messages.append(f"{sender}: {message.text}")
-                
-                # Join the messages with newlines
-                formatted_messages = "\n".join(previous_messages)
-                
-                # Check if we already have GitHub and email - first from DB
-                github_username = person.get("github_username")
-                email = person.get("email")
-                
-                # If we don't have complete info, try to extract from previous messages
-                if not (github_username and email) and previous_messages:
-                    extract_prompt = prompts["extract_info"].format(
-                        previous_messages=formatted_messages
-                    )
-                    
-                    extraction_response = await self.ai.act(extract_prompt)
-                    try:
-                        extracted_info = json.loads(extraction_response["response"])
-                        
-                        # Update github_username if we found it
-                        if not github_username and extracted_info.get("github_username"):
-                            github_username = extracted_info["github_username"]
-                            if github_username.lower() != "null":
-                                people.update_one(
-                                    {"_id": person["_id"]}, 
-                                    {"$set": {"github_username": github_username}}
-                                )
-                                self.logger.info(f"Extracted GitHub for {x_username}: {github_username}")
-                        
-                        # Update email if we found it
-                        if not email and extracted_info.get("email"):
-                            email = extracted_info["email"]
-                            if email.lower() != "null":
-                                people.update_one(
-                                    {"_id": person["_id"]}, 
-                                    {"$set": {"email": email}}
-                                )
-                                self.logger.info(f"Extracted email for {x_username}: {email}")
-                    except json.JSONDecodeError:
-                        self.logger.error(f"Failed to parse extraction response: {extraction_response['response']}")
-                
-                # Check if we now have all the info we need
-                if github_username and email:
-                    people.update_one(
-                        {"_id": person["_id"]}, 
-                        {"$set": {"state": "testing"}}
-                    )
-                    self.logger.info(f"Updated state for {x_username} to completed - all info gathered")
-                    continue  # Skip to next person
-                
-                # Get current gather attempt count
-                gather_attempts = person.get("gather_attempts", 0)
-                
-                # If we've already tried 3 times, mark as stalled
-                if gather_attempts >= 3:
-                    people.update_one(
-                        {"_id": person["_id"]}, 
-                        {"$set": {"state": "stalled"}}
-                    )
-                    self.logger.info(f"Marked {x_username} as stalled after {gather_attempts} attempts")
-                    continue  # Skip to next person
-                
-                # Determine what info we have and what we still need
-                gathered_info = []
-                needed_info = []
-                
-                if github_username:
-                    gathered_info.append(f"GitHub username: {github_username}")
-                else:
-                    needed_info.append("GitHub username")
-                
-                if email:
-                    gathered_info.append(f"email: {email}")
-                else:
-                    needed_info.append("email address")
-                
-                currently_gathered = "nothing yet" if not gathered_info else ", ".join(gathered_info)
-                remaining_info = ", ".join(needed_info) if needed_info else "all required information"
-                
-                # Format the gather prompt with the variables
-                base_prompt = prompts["gather"].format(
-                    currently_gathered=currently_gathered,
-                    remaining_info=remaining_info,
-                    previous_messages=formatted_messages
+        await self.dispatch("gathering", people.find({"state": {"$in": ["gathering"]}}, {"_id": 1}))
+
+    async def sync(self, person, user_id):
+        """
+        Fetches the DMs that arrived since the person's cursor, newest pages
+        first, stopping at the last message already synced.
+
+        Args:
+            person (dict): The person, with their dm_cursor if synced before
+            user_id (str): The person's twitter user id
+
+        Returns:
+            tuple[list[dict], dict]: New messages oldest first, in the person's dm format,
+            and the cursor to save once they're processed
+        """
+        cursor = person.get("dm_cursor") or {}
+        last = int(cursor.get("last_id") or 0)
+        fresh = []
+        async with self.limits["twitter"]:
+            result = await self.twtw.client.get_dm_history(user_id)
+            # without a cursor only the latest page is read, as before cursors existed
+            pages = SYNC_PAGES if last else 1
+            for read in range(pages):
+                page = list(result)
+                newer = [message for message in page if int(message.id) > last]
+                fresh.extend(newer)
+                # stop at a page reaching back to synced messages, and never fetch past the last page allowed
+                if not page or len(newer) < len(page) or read == pages - 1:
+                    break
+                result = await result.next()
+
+        # history comes newest first
+        fresh.sort(key=lambda message: int(message.id))
+        digest = cursor.get("digest", "")
+        new = []
+        for message in fresh:
+            digest = hashlib.sha256(f"{digest}{message.id}{message.text}".encode()).hexdigest()
+            new.append({
+                "timestamp": datetime.now(),
+                "content": message.text,
+                "id": message.id,
+                "sender": "candidate" if message.sender_id == user_id else "naderai",
+            })
+
+        if not new:
+            return new, cursor
+        cursor = {**cursor, "last_id": new[-1]["id"], "digest": digest}
+        if any(message["sender"] == "candidate" for message in new):
+            cursor["last_at"] = datetime.now()
+        return new, cursor
+
+    async def gather_person(self, person):
+        x_username = person.get("x_username")
+        
+        async with self.limits["twitter"]:
+            # Get user ID from username
+            user_id = str(await self.twtw.uid(x_username))
+        
+        # Only what arrived since the last pass is fetched
+        new, cursor = await self.sync(person, user_id)
+        replied = any(message["sender"] == "candidate" for message in new)
+        
+        # Idle candidates cost nothing until they reply or are due a nudge
+        synced = person.get("dm_cursor") is not None
+        last = max([at for at in (cursor.get("last_at"), cursor.get("nudged_at")) if at], default=None)
+        due = last is None or (datetime.now() - last).total_seconds() >= NUDGE_AFTER
+        if synced and not replied and not due:
+            if new:
+                await self.states.move(
+                    {"_id": person["_id"]}, "gathering", "gathering",
+                    {"$push": {"dm": {"$each": new}}, "$set": {"dm_cursor": cursor}}
                 )
+            return
+        
+        self.logger.info(f"gathering info for {x_username}, {len(new)} new messages")
+        history = (person.get("dm") or []) + new
+        
+        # Format previous messages for the prompt
+        previous_messages = [
+            f"{'them' if message['sender'] == 'candidate' else 'you'}: {message['content']}"
+            for message in history
+        ]
+        
+        # Join the messages with newlines
+        formatted_messages = "\n".join(previous_messages)
+        
+        # Check if we already have GitHub and email - first from DB
+        github_username = person.get("github_username")
+        email = person.get("email")
+        
+        # Everything below goes out in one update along with the synced messages
+        update = {"$set": {"dm_cursor": cursor}}
+        if new:
+            update["$push"] = {"dm": {"$each": new}}
+        
+        # Only new replies can hold new info
+        if not (github_username and email) and replied:
+            extract_prompt = prompts["extract_info"].format(
+                previous_messages=formatted_messages
+            )
+            
+            async with self.limits["llm"]:
+                extraction_response = await self.ai.act(extract_prompt, key="extract_info", cache=True)
+            if extraction_response["status"] == "success":
+                # "null" strings are already normalized to None by the extract_info schema
+                extracted_info = extraction_response["response"]
                 
-                gather_response = await self.ai.act(base_prompt)
-                msg = gather_response["response"]
-                self.logger.info(f"gathering message: {msg}")
-                
-                # Send the message
-                await self.twtw.client.send_dm(user_id=user_id, text=msg)
-                self.logger.info(f"sent gathering message to {x_username}")
-                
-                # Update gather attempts and state
-                people.update_one(
-                    {"_id": person["_id"]}, 
-                    {
-                        "$set": {"state": "gathering"},
-                        "$inc": {"gather_attempts": 1}
-                    }
-                )
-                self.logger.info(f"Updated gather attempts for {x_username} to {gather_attempts + 1}")
+                # Update github_username if we found it
+                if not github_username and extracted_info.get("github_username"):
+                    github_username = extracted_info["github_username"]
+                    update["$set"]["github_username"] = github_username
+                    self.logger.info(f"Extracted GitHub for {x_username}: {github_username}")
                 
-            except Exception as e:
-                self.logger.error(f"Failed to process gathering for {x_username}: {str(e)}")
+                # Update email if we found it
+                if not email and extracted_info.get("email"):
+                    email = extracted_info["email"]
+                    update["$set"]["email"] = email
+                    self.logger.info(f"Extracted email for {x_username}: {email}")
+            else:
+                # leave the cursor where it was so the extraction is retried
+                raise Exception(f"Failed to extract info for {x_username}: {extraction_response['response']}")
+        
+        # Check if we now have all the info we need
+        if github_username and email:
+            if await self.states.move({"_id": person["_id"]}, "gathering", "testing", update):
+                self.logger.info(f"Updated state for {x_username} to completed - all info gathered")
+            return
+        
+        # Get current gather attempt count
+        gather_attempts = person.get("gather_attempts", 0)
+        
+        # If we've already tried 3 times, mark as stalled
+        if gather_attempts >= 3:
+            if await self.states.move({"_id": person["_id"]}, "gathering", "stalled", update):
+                self.logger.info(f"Marked {x_username} as stalled after {gather_attempts} attempts")
+            return
+        
+        # Determine what info we have and what we still need
+        gathered_info = []
+        needed_info = []
+        
+        if github_username:
+            gathered_info.append(f"GitHub username: {github_username}")
+        else:
+            needed_info.append("GitHub username")
+        
+        if email:
+            gathered_info.append(f"email: {email}")
+        else:
+            needed_info.append("email address")
+        
+        currently_gathered = "nothing yet" if not gathered_info else ", ".join(gathered_info)
+        remaining_info = ", ".join(needed_info) if needed_info else "all required information"
+        
+        # Format the gather prompt with the variables, newest messages survive the budget
+        builder = PromptBuilder().fixed(prompts["gather"].format(
+            referrer=person.get("referrer") or "someone in the network",
+            gathered=currently_gathered,
+            needed=remaining_info,
+        ))
+        builder.section("PREVIOUS CONVERSATION", previous_messages, priority=0, keep="last")
+        
+        async with self.limits["llm"]:
+            gather_response = await self.ai.act(builder.build(), key="gather")
+        if gather_response["status"] != "success":
+            raise Exception(f"gathering message failed: {gather_response['response']}")
+        msg = gather_response["response"]["message"]
+        self.logger.info(f"gathering message: {msg}")
+        
+        # Send the message
+        async with self.limits["twitter"]:
+            await self.twtw.client.send_dm(user_id=user_id, text=msg)
+        self.logger.info(f"sent gathering message to {x_username}")
+        
+        # Update gather attempts and state, the sent message is synced on the next pass
+        update["$set"]["dm_cursor"] = {**cursor, "nudged_at": datetime.now()}
+        update["$inc"] = {"gather_attempts": 1}
+        if await self.states.move({"_id": person["_id"]}, "gathering", "gathering", update):
+            self.logger.info(f"Updated gather attempts for {x_username} to {gather_attempts + 1}")
     
     async def gather(self):
         """Process users in gathering state to collect GitHub and email info"""
@@ -352,71 +619,117 @@ class Orchestrator:
             return
 
         people = self.mdb.client["network"]["people"]
+        await self.dispatch("testing", people.find({"state": "testing"}, {"_id": 1}))
+
+    async def test_person(self, person):
+        github_username = person.get("github_username")
         
-        for person in people.find({"state": "testing"}):
-            telegram_id = person.get("telegram_id")
-            github_username = person.get("github_username")
-            
-            self.logger.info(f"processing testing for {github_username}")
-            
-            repos = self.git.get_user_repositories(github_username)
-            
-            extra = textwrap.dedent(f"""
-                GITHUB DETAILS ABOUT THE POTENTIAL CANDIDATE:
-                - CANDIDATES GitHub Username: {github_username}
-                - CANDIDATES GitHub Repositories: {repos}
-                - CANDIDATES GitHub Repositories Stars: {
-                    [repo["stars"] for repo in repos or []]
-                }
-                - CANDIDATES GitHub Repositories Descriptions: {
-                    [repo["description"] for repo in repos or []]
-                }
-                - CANDIDATES GitHub Repositories Readmes: {
-                    [self.git.get_repo_readme(github_username, repo["name"]) for repo in repos or []]
-                }
-            """)
-
-            prompt = await self.prompt("testing", extra)
-            
-            try:
-                response = await self.ai.act(prompt)
-                # The response is already a dict, not a string, so we need to access the 'response' field
-                # and then parse that as JSON
-                response_text = response["response"]
-                
-                # Check if response_text is already a dict or if it needs to be parsed
-                if isinstance(response_text, str): parsed_response = json.loads(response_text)
-                else: parsed_response = response_text
-                    
-                fit_score = int(parsed_response["fit_score"])
-                
-                if fit_score >= 65:
-                    people.update_one(
-                        {"_id": person["_id"]},
-                        {"$set": {
-                            "state": "accepted",
-                            "fit_score": fit_score,
-                            "evaluation_comments": parsed_response["comments"]
-                        }}
-                    )
-                else:
-                    people.update_one(
-                        {"_id": person["_id"]},
-                        {"$set": {
-                            "state": "rejected", 
-                            "fit_score": fit_score,
-                            "evaluation_comments": parsed_response["comments"]
-                        }}
-                    )
-                
-            except Exception as e:
-                self.logger.error(f"Failed to process testing for {github_username}: {str(e)}")
+        self.logger.info(f"processing testing for {github_username}")
+        
+        # best starred repos first so they survive the prompt budget
+        repos = sorted(
+            await self.github(self.git.get_user_repositories, github_username) or [],
+            key=lambda repo: repo["stars"],
+            reverse=True,
+        )
+        
+        # nothing pushed since the last evaluation, e.g. one that failed before the move
+        evaluation = person.get("github_evaluation") or {}
+        digest = snapshot(repos)
+        if evaluation.get("snapshot") == digest:
+            self.logger.info(f"repos of {github_username} unchanged, reusing fit score {evaluation['fit_score']}")
+            Metrics.inc("github_evaluations_total", result="reused")
+        else:
+            evaluation = await self.evaluate(github_username, repos)
+            Metrics.inc("github_evaluations_total", result="scored")
+            # written apart from the move so it outlives a lost lease or a failed transition
+            await self.writes.add(
+                {"_id": person["_id"]},
+                {"$set": {"github_evaluation": {**evaluation, "snapshot": digest, "evaluated_at": datetime.now()}}},
+            )
+        
+        await self.states.move(
+            {"_id": person["_id"]},
+            "testing",
+            "accepted" if evaluation["fit_score"] >= 65 else "rejected",
+            {"$set": {
+                "fit_score": evaluation["fit_score"],
+                "evaluation_comments": evaluation.get("comments")
+            }}
+        )
+    
+    async def evaluate(self, github_username: str, repos: list[dict]) -> dict:
+        """
+        Scores a candidate's fit from their repositories and READMEs.
+
+        Args:
+            github_username (str): GitHub username of the candidate
+            repos (list[dict]): Their repositories, most starred first
+
+        Returns:
+            dict: {"fit_score": int, "comments": str | None}
+        """
+        readmes = await asyncio.gather(
+            *(self.github(self.git.get_repo_readme, github_username, repo["name"]) for repo in repos)
+        )
+        
+        extra = textwrap.dedent(f"""
+            GITHUB DETAILS ABOUT THE POTENTIAL CANDIDATE:
+            - CANDIDATES GitHub Username: {github_username}
+        """)
+        
+        builder = PromptBuilder().fixed(await self.prompt("testing", extra))
+        builder.section(
+            "- CANDIDATES GitHub Repositories (name, stars, description)",
+            [f"{repo['name']} ({repo['stars']} stars): {repo['description']}" for repo in repos],
+            priority=0,
+        )
+        builder.section(
+            "- CANDIDATES GitHub Repositories Readmes",
+            [f"{repo['name']}: {readme}" for repo, readme in zip(repos, readmes) if readme],
+            priority=1,
+            cap=README_TOKENS,
+        )
+        prompt = builder.build()
+        
+        async with self.limits["llm"]:
+            response = await self.ai.act(prompt, key="testing", cache=True)
+        if response["status"] != "success":
+            raise Exception(f"fit evaluation failed: {response['response']}")
+        
+        # validated against the testing schema, fit_score is already an int
+        parsed_response = response["response"]
+        return {"fit_score": parsed_response["fit_score"], "comments": parsed_response.get("comments")}
 
 if __name__ == "__main__":
-    orchestrator = Orchestrator()
+    async def main():
+        orchestrator = Orchestrator()
+        if os.getenv("METRICS_PORT"):
+            Metrics.serve(int(os.getenv("METRICS_PORT") or 0))
+        
+        await orchestrator.twtw.login(
+            username=os.getenv("TWITTER_USERNAME"),
+            email=os.getenv("TWITTER_EMAIL"),
+            password=os.getenv("TWITTER_PASSWORD"),
+        )
+        
+        # start the scheduler, `PUBLISH orchestrator:run <stage>` runs a stage right away
+        interval = float(os.getenv("STAGE_INTERVAL", 15 * 60))
+        scheduler = Scheduler(kv=orchestrator.kv)
+        scheduler.add("seeds", orchestrator.seeds, interval, jitter=60)
+        scheduler.add("gather", orchestrator.gather, interval, jitter=60)
+        scheduler.add("testing", orchestrator.testing, interval, jitter=60)
+        
+        # react to new people and state changes right away, the stages above stay on as the sweep
+        feed = None
+        if os.getenv("CHANGE_STREAMS", "0") == "1":
+            feed = asyncio.create_task(orchestrator.watch())
+        try:
+            await scheduler.run()
+        finally:
+            if feed:
+                feed.cancel()
+                await asyncio.gather(feed, return_exceptions=True)
+            await orchestrator.writes.close()
     
-    # start the scheduler
-    schedule.every(15).minutes.do(orchestrator.seeds)
-    schedule.every(15).minutes.do(orchestrator.gather)
-    schedule.every(15).minutes.do(orchestrator.testing)
-    
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+import asyncio
+import random
+import signal
+import time
+from typing import Awaitable, Callable, Optional
+from engine.packages.log import Logger
+from engine.packages.red import Red
+
+# redis channel taking a stage name to run right away
+CHANNEL = "orchestrator:run"
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        interval: float,
+        jitter: float = 0.0,
+        concurrency: int = 1,
+    ):
+        """
+        A pipeline stage run periodically by the Scheduler.
+
+        Args:
+            name (str): Stage name, also used for run-now triggers
+            func (Callable): Coroutine function doing one pass of the stage
+            interval (float): Seconds between passes
+            jitter (float, optional): Max random seconds added to each interval. Defaults to 0.
+            concurrency (int, optional): Max passes of this stage in flight at once. Defaults to 1, no overlap.
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.slots = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.running = 0
+        self.wake = asyncio.Event()
+        self.runs = 0
+        self.last: Optional[float] = None
+
+
+class Scheduler:
+    """
+    Runs orchestrator stages on their own intervals inside one event loop.
+    A stage never overlaps itself beyond its concurrency, triggers that arrive
+    mid-pass are coalesced into one follow-up pass, and shutdown lets running
+    passes finish within a grace period.
+    """
+
+    def __init__(self, kv: Optional[Red] = None, limit: Optional[int] = None, grace: float = 60.0):
+        """
+        Initialize the Scheduler.
+
+        Args:
+            kv (Red, optional): Redis client to listen for run-now triggers on CHANNEL
+            limit (int, optional): Max passes in flight across all stages
+            grace (float, optional): Seconds running passes get to finish on shutdown. Defaults to 60.
+        """
+        self.logger = Logger("scheduler", persist=True)
+        self.kv = kv
+        self.grace = grace
+        self.limit = asyncio.Semaphore(limit) if limit else None
+        self.stages: dict[str, Stage] = {}
+        self.tasks: set[asyncio.Task] = set()
+        self.stopping = asyncio.Event()
+
+    def add(self, name: str, func: Callable[[], Awaitable], interval: float, jitter: float = 0.0, concurrency: int = 1):
+        """Registers a stage, see Stage for the arguments."""
+        self.stages[name] = Stage(name, func, interval, jitter, concurrency)
+
+    def trigger(self, name: str):
+        """
+        Runs a stage as soon as it has a free slot instead of waiting for its interval.
+
+        Args:
+            name (str): Stage name
+        """
+        if name not in self.stages:
+            self.logger.error(f"can't trigger unknown stage {name}")
+            return
+        self.logger.info(f"triggered {name}")
+        self.stages[name].wake.set()
+
+    def stop(self):
+        """Stops scheduling new passes, running ones get the grace period to finish."""
+        if not self.stopping.is_set():
+            self.logger.info("stopping scheduler")
+            self.stopping.set()
+            for stage in self.stages.values():
+                stage.wake.set()
+
+    async def run(self):
+        """Runs every stage until stop() is called or the process is signalled."""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        loops = [asyncio.create_task(self._loop(stage)) for stage in self.stages.values()]
+        if self.kv is not None:
+            loops.append(asyncio.create_task(self._listen()))
+        self.logger.info(f"scheduling stages {list(self.stages)}")
+
+        await self.stopping.wait()
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+
+        if self.tasks:
+            self.logger.info(f"waiting up to {self.grace}s for {len(self.tasks)} running passes")
+            _, pending = await asyncio.wait(self.tasks, timeout=self.grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self.logger.info("scheduler stopped")
+
+    async def _loop(self, stage: Stage):
+        while not self.stopping.is_set():
+            await stage.slots.acquire()
+            if self.stopping.is_set():
+                stage.slots.release()
+                return
+            stage.wake.clear()
+            task = asyncio.create_task(self._pass(stage))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+            delay = stage.interval + random.uniform(0, stage.jitter)
+            try:
+                await asyncio.wait_for(stage.wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _pass(self, stage: Stage):
+        started = time.monotonic()
+        stage.running += 1
+        try:
+            if self.limit:
+                async with self.limit:
+                    await stage.func()
+            else:
+                await stage.func()
+            stage.runs += 1
+            self.logger.info(f"{stage.name} pass finished in {time.monotonic() - started:.1f}s")
+        except asyncio.CancelledError:
+            self.logger.error(f"{stage.name} pass cancelled")
+            raise
+        except Exception as e:
+            self.logger.error(f"{stage.name} pass failed: {e}")
+        finally:
+            stage.running -= 1
+            stage.last = time.monotonic()
+            stage.slots.release()
+
+    async def _listen(self):
+        while not self.stopping.is_set():
+            try:
+                pubsub = self.kv.red.pubsub()
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.trigger(str(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"error listening on {CHANNEL}: {e}")
+                await asyncio.sleep(30)
@@ -0,0 +1,200 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+from redis.exceptions import ResponseError
+from engine.packages.log import Logger
+from engine.packages.metrics import Metrics
+from engine.packages.red import Red
+
+STREAM = "orchestrator:work"
+DEAD = "orchestrator:dead"
+GROUP = "stages"
+# approximate cap on entries kept in each stream
+MAXLEN = 100_000
+# ms a consumer blocks waiting for new items
+BLOCK = 5000
+
+
+class Busy(Exception):
+    """Raised by a handler to leave its item pending until it's reclaimed, without counting as a failure."""
+
+
+class WorkQueue:
+    """
+    Stage work items (person id + stage) on a redis stream, consumed by any
+    number of worker processes through one consumer group. An item is acked
+    once its handler succeeds. One left pending by a failed or dead consumer
+    is reclaimed after the visibility timeout, and one delivered more than
+    `retries` times goes to the dead-letter stream.
+    """
+
+    def __init__(
+        self,
+        kv: Red,
+        stream: str = STREAM,
+        group: str = GROUP,
+        dead: str = DEAD,
+        visibility: float = 300.0,
+        retries: int = 3,
+    ):
+        """
+        Initialize the WorkQueue.
+
+        Args:
+            kv (Red): Redis client
+            stream (str, optional): Stream holding work items. Defaults to STREAM.
+            group (str, optional): Consumer group shared by the workers. Defaults to GROUP.
+            dead (str, optional): Stream items go to once out of retries. Defaults to DEAD.
+            visibility (float, optional): Seconds an item may stay unacked before another
+                consumer reclaims it. Defaults to 300.
+            retries (int, optional): Deliveries after the first before an item is dead-lettered. Defaults to 3.
+        """
+        self.logger = Logger("workqueue", persist=True)
+        self.kv = kv
+        self.stream = stream
+        self.group = group
+        self.dead = dead
+        self.visibility = visibility
+        self.retries = retries
+
+    def queued(self, stage: str, person: str) -> str:
+        # marks an item as queued or in flight so discovery passes don't pile up duplicates
+        return f"{self.stream}:queued:{stage}:{person}"
+
+    async def ensure(self):
+        """Creates the stream and consumer group if they don't exist yet."""
+        try:
+            await self.kv.red.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            self.logger.info(f"created consumer group {self.group} on {self.stream}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def publish(self, person, stage: str) -> Optional[str]:
+        """
+        Queues a stage for a person unless it's already queued or in flight.
+
+        Args:
+            person (ObjectId | str): The person's _id
+            stage (str): State whose handler should run for the person
+
+        Returns:
+            Optional[str]: The stream entry id, None if the item was already queued
+        """
+        person = str(person)
+        ttl = int(self.visibility * (self.retries + 2))
+        if not await self.kv.red.set(self.queued(stage, person), 1, nx=True, ex=ttl):
+            return None
+        entry = await self.kv.red.xadd(self.stream, {"person": person, "stage": stage}, maxlen=MAXLEN, approximate=True)
+        Metrics.inc("work_items_total", stage=stage, outcome="queued")
+        return entry
+
+    async def consume(
+        self,
+        consumer: str,
+        handler: Callable[[str, str], Awaitable],
+        dead: Optional[Callable[[str, str, str], Awaitable]] = None,
+        concurrency: int = 8,
+        stop: Optional[asyncio.Event] = None,
+    ):
+        """
+        Runs handlers for queued items until stop is set.
+
+        Args:
+            consumer (str): Consumer name of this process within the group
+            handler (Callable): Coroutine function taking (stage, person id), raising to retry,
+                or raising Busy to try again later without using up a retry
+            dead (Callable, optional): Coroutine function taking (stage, person id, error), called
+                when an item is dead-lettered
+            concurrency (int, optional): Items handled at once by this process. Defaults to 8.
+            stop (asyncio.Event, optional): Set to stop taking new items
+        """
+        await self.ensure()
+        stop = stop or asyncio.Event()
+        self.logger.info(f"{consumer} consuming {self.stream} with {concurrency} workers")
+        await asyncio.gather(*(self.worker(consumer, handler, dead, stop) for _ in range(concurrency)))
+
+    async def worker(self, consumer, handler, dead, stop: asyncio.Event):
+        while not stop.is_set():
+            try:
+                item = await self.next(consumer)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"error reading {self.stream}: {e}")
+                await asyncio.sleep(5)
+                continue
+            if item is None:
+                continue
+            try:
+                await self.handle(item, handler, dead)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # left pending, it's reclaimed after the visibility timeout
+                self.logger.error(f"error handling {item[0]} from {self.stream}: {e}")
+
+    async def next(self, consumer: str) -> Optional[tuple[str, dict, bool]]:
+        # items abandoned past the visibility timeout come before new ones
+        _, claimed, *_ = await self.kv.red.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=int(self.visibility * 1000), start_id="0-0", count=1
+        )
+        if claimed:
+            return claimed[0][0], claimed[0][1], True
+
+        entries = await self.kv.red.xreadgroup(self.group, consumer, {self.stream: ">"}, count=1, block=BLOCK)
+        for _, messages in entries or []:
+            for entry, fields in messages:
+                return entry, fields, False
+        return None
+
+    async def deliveries(self, entry: str) -> int:
+        pending = await self.kv.red.xpending_range(self.stream, self.group, min=entry, max=entry, count=1)
+        return pending[0]["times_delivered"] if pending else 1
+
+    async def handle(self, item: tuple[str, dict, bool], handler, dead):
+        entry, fields, reclaimed = item
+        if not fields:
+            # trimmed by MAXLEN while pending, xautoclaim still hands it out without fields.
+            # its queued marker can't be found without them and is left to expire
+            Metrics.inc("work_items_total", stage="unknown", outcome="trimmed")
+            self.logger.error(f"dropping {entry}, trimmed from {self.stream} before it was handled")
+            await self.kv.red.xack(self.stream, self.group, entry)
+            return
+        stage, person = fields.get("stage"), fields.get("person")
+        if reclaimed:
+            self.logger.info(f"reclaimed {stage} for {person} ({entry})")
+
+        started = time.monotonic()
+        try:
+            await handler(stage, person)
+        except asyncio.CancelledError:
+            # left pending, another consumer reclaims it after the visibility timeout
+            raise
+        except Busy as e:
+            Metrics.inc("work_items_total", stage=stage, outcome="busy")
+            self.logger.info(f"{stage} for {person} is busy, retrying after {self.visibility}s: {e}")
+            return
+        except Exception as e:
+            attempts = await self.deliveries(entry)
+            if attempts <= self.retries:
+                Metrics.inc("work_items_total", stage=stage, outcome="retry")
+                self.logger.error(f"{stage} failed for {person} (attempt {attempts}), retrying after {self.visibility}s: {e}")
+                return
+            Metrics.inc("work_items_total", stage=stage, outcome="dead")
+            self.logger.error(f"{stage} failed for {person} after {attempts} attempts, dead-lettering: {e}")
+            await self.kv.red.xadd(
+                self.dead, {**fields, "entry": entry, "attempts": attempts, "error": str(e)[:500]},
+                maxlen=MAXLEN, approximate=True,
+            )
+            if dead:
+                try:
+                    await dead(stage, person, str(e))
+                except Exception as de:
+                    self.logger.error(f"error recording dead {stage} for {person}: {de}")
+        else:
+            Metrics.inc("work_items_total", stage=stage, outcome="ok")
+            Metrics.observe("work_item_seconds", time.monotonic() - started, stage=stage)
+
+        await self.kv.red.xack(self.stream, self.group, entry)
+        await self.kv.red.delete(self.queued(stage, person))
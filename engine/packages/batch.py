@@ -0,0 +1,172 @@
+import asyncio
+import inspect
+import time
+from typing import Any, Awaitable, Callable, Optional, Union
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from engine.packages.log import Logger
+from engine.packages.metrics import Metrics
+
+
+def _each(value) -> list:
+    return list(value["$each"]) if isinstance(value, dict) and "$each" in value else [value]
+
+
+def merge(into: dict, update: dict) -> dict:
+    """
+    Folds one update document into another so both apply in a single write:
+    $set/$unset fields are overwritten by the later update, $inc is summed and
+    $push values are appended in order.
+
+    Args:
+        into (dict): Update document merged into, modified in place
+        update (dict): Later update document
+
+    Returns:
+        dict: The merged update document
+    """
+    for op, fields in update.items():
+        target = into.setdefault(op, {})
+        for field, value in fields.items():
+            if op == "$inc":
+                target[field] = target.get(field, 0) + value
+            elif op == "$push" and field in target:
+                target[field] = {"$each": _each(target[field]) + _each(value)}
+            else:
+                target[field] = value
+            # a later $set wins over an earlier $unset of the same field and the other way round
+            other = {"$set": "$unset", "$unset": "$set"}.get(op)
+            if other and field in into.get(other, {}):
+                del into[other][field]
+    return {op: fields for op, fields in into.items() if fields}
+
+
+class Pending:
+    def __init__(self, match: dict, update: dict):
+        self.match = match
+        self.update = update
+        self.futures: list[asyncio.Future] = []
+
+
+class WriteBatcher:
+    """
+    Write-behind buffer for one collection. Updates are merged per document
+    key and flushed together with one unordered bulk_write once `size`
+    documents are pending or `interval` seconds passed, so a stage pass costs a
+    handful of round trips instead of one or more per person. Each add returns
+    a future that fails with the error of that document's write.
+    """
+
+    def __init__(
+        self,
+        collection,
+        size: int = 100,
+        interval: float = 1.0,
+        on_error: Optional[Callable[[Any, Exception], Union[None, Awaitable]]] = None,
+    ):
+        """
+        Initialize the WriteBatcher.
+
+        Args:
+            collection (Collection): Collection the updates go to
+            size (int, optional): Pending documents that trigger a flush. Defaults to 100.
+            interval (float, optional): Max seconds an update waits before it's flushed. Defaults to 1.
+            on_error (Callable, optional): Called with (key, error) for every failed write,
+                awaited if it's a coroutine function. It mustn't write through this batcher.
+        """
+        self.logger = Logger("batch", persist=True)
+        self.collection = collection
+        self.size = size
+        self.interval = interval
+        self.on_error = on_error
+        self.pending: dict[Any, Pending] = {}
+        self.lock = asyncio.Lock()
+        self.timer: Optional[asyncio.Task] = None
+
+    def queued(self, key) -> Optional[dict]:
+        """Returns the update waiting to be flushed for a key, if any."""
+        entry = self.pending.get(key)
+        return entry.update if entry else None
+
+    async def add(self, match: dict, update: dict, key: Any = None) -> asyncio.Future:
+        """
+        Queues an update, merged with what's already pending for the same key.
+
+        Args:
+            match (dict): Filter of the update
+            update (dict): Update document
+            key (Any, optional): Document key to merge on. Defaults to match["_id"].
+
+        Returns:
+            asyncio.Future: Resolves to True once written, or fails with the write's error
+        """
+        key = match.get("_id") if key is None else key
+        # updates under another filter can't share a write, the earlier one goes out first
+        while (entry := self.pending.get(key)) is not None and entry.match != match:
+            await self.flush()
+        if entry is None:
+            entry = self.pending[key] = Pending(match, {})
+        entry.update = merge(entry.update, update)
+
+        future = asyncio.get_running_loop().create_future()
+        # failures are also reported through on_error, callers don't have to await
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        entry.futures.append(future)
+
+        if len(self.pending) >= self.size:
+            await self.flush()
+        elif self.timer is None or self.timer.done():
+            self.timer = asyncio.create_task(self.later())
+        return future
+
+    async def later(self):
+        await asyncio.sleep(self.interval)
+        # a flush in flight finishes even if the timer is cancelled
+        await asyncio.shield(self.flush())
+
+    async def flush(self):
+        """Writes everything pending in one unordered bulk_write."""
+        async with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending = list(self.pending.items()), {}
+
+            started = time.monotonic()
+            operations = [UpdateOne(entry.match, entry.update) for _, entry in batch]
+            errors: dict[int, Exception] = {}
+            try:
+                await asyncio.to_thread(self.collection.bulk_write, operations, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    errors[error["index"]] = Exception(error.get("errmsg", "write failed"))
+            except Exception as e:
+                errors = {index: e for index in range(len(batch))}
+            Metrics.observe("mongo_bulk_seconds", time.monotonic() - started, collection=self.collection.name)
+            Metrics.inc("mongo_bulk_writes_total", collection=self.collection.name)
+            Metrics.inc("mongo_batched_updates_total", len(batch), collection=self.collection.name)
+
+            for index, (key, entry) in enumerate(batch):
+                error = errors.get(index)
+                if error is not None:
+                    Metrics.inc("mongo_write_failures_total", collection=self.collection.name)
+                    self.logger.error(f"failed to write {key}: {error}")
+                    if self.on_error:
+                        try:
+                            reported = self.on_error(key, error)
+                            if inspect.isawaitable(reported):
+                                await reported
+                        except Exception as e:
+                            self.logger.error(f"error reporting failed write for {key}: {e}")
+                for future in entry.futures:
+                    if future.done():
+                        continue
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(True)
+
+    async def close(self):
+        """Flushes what's left and stops the timer."""
+        if self.timer is not None and not self.timer.done():
+            self.timer.cancel()
+        await self.flush()
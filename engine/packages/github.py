@@ -27,7 +27,12 @@ class GithubWorker:
             repos = response.json()
             # Filter out forked repositories
             non_fork_repos = [
-                {"name": repo["name"], "stars": repo["stargazers_count"], "description": repo["description"]}
+                {
+                    "name": repo["name"],
+                    "stars": repo["stargazers_count"],
+                    "description": repo["description"],
+                    "pushed_at": repo.get("pushed_at"),
+                }
                 for repo in repos if not repo.get("fork", False)
             ]
             return non_fork_repos
@@ -0,0 +1,56 @@
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from engine.packages.log import Logger
+from engine.packages.mongo import MDB
+
+logger = Logger("indexes", persist=True)
+
+# (database, collection) -> indexes the hot queries rely on
+INDEXES: dict[tuple[str, str], list[IndexModel]] = {
+    ("network", "people"): [
+        # stage sweeps and claims filter on state, by _id within it
+        IndexModel([("state", ASCENDING), ("_id", ASCENDING)], name="state_id"),
+        # one person per handle, people without the handle aren't indexed
+        IndexModel(
+            [("telegram_username", ASCENDING)],
+            name="telegram_username_unique",
+            unique=True,
+            partialFilterExpression={"telegram_username": {"$type": "string"}},
+        ),
+        IndexModel(
+            [("x_username", ASCENDING)],
+            name="x_username_unique",
+            unique=True,
+            partialFilterExpression={"x_username": {"$type": "string"}},
+        ),
+    ],
+    ("job_board", "jobs"): [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        # job indexes read what changed since their last refresh
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+}
+
+
+def ensure(mdb: MDB):
+    """
+    Creates any missing index in INDEXES. Existing indexes are left alone,
+    and a failure (e.g. duplicates blocking a unique index) is logged
+    without stopping startup.
+
+    Args:
+        mdb (MDB): Connected Mongo wrapper
+    """
+    if mdb.client is None:
+        logger.error("can't ensure indexes, MongoDB client not available")
+        return
+
+    for (database, collection), indexes in INDEXES.items():
+        # one at a time so a bad index doesn't hold back the others
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                mdb.client[database][collection].create_indexes([index])
+                logger.info(f"ensured index {name} on {database}.{collection}")
+            except PyMongoError as e:
+                logger.error(f"failed to ensure index {name} on {database}.{collection}: {e}")
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+from engine.packages.log import Logger
+from engine.packages.mongo import MDB
+from engine.packages.red import Red
+
+# bumped whenever a job is posted or changes status, readers refresh when it moves
+VERSION_KEY = "jobs:version"
+# jobs sent to the LLM for a match evaluation
+SHORTLIST = int(os.getenv("JOB_SHORTLIST", 5))
+# seconds an unchanged version is trusted before the index checks Mongo anyway, covers missed bumps
+REFRESH = float(os.getenv("JOB_INDEX_REFRESH", 60))
+# changed jobs are re-read this far behind the watermark, other hosts' clocks may lag
+SKEW = timedelta(seconds=60)
+# seconds a match evaluation is reused while neither the open jobs nor the candidate's details change
+MATCH_TTL = int(os.getenv("JOB_MATCH_TTL", 7 * 24 * 60 * 60))
+# fields the index and the match prompts read
+FIELDS = {"companyName": 1, "companyDescription": 1, "jobDescription": 1, "calComLink": 1, "status": 1, "updated_at": 1}
+
+TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.-]*[a-z0-9+#]|[a-z0-9]")
+
+
+def tokens(text: str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+
+def text(job: dict) -> str:
+    return " ".join(job.get(field) or "" for field in ("companyName", "companyDescription", "jobDescription"))
+
+
+async def bump_version(kv: Red) -> Optional[int]:
+    """
+    Tells every job index that the open jobs changed. Call after posting a job
+    or changing its status, alongside setting its updated_at.
+
+    Args:
+        kv (Red): Redis wrapper
+
+    Returns:
+        int | None: The new version, None if Redis couldn't be reached
+    """
+    try:
+        return await kv.red.incr(VERSION_KEY)
+    except Exception as e:
+        Logger("jobs", persist=True).error(f"failed to bump job version: {e}")
+        return None
+
+
+def profile_version(details: Optional[dict]) -> str:
+    """Hash of a candidate's extracted details, the same whatever order skills were found in."""
+    details = {field: sorted(value) if isinstance(value, list) else value for field, value in (details or {}).items()}
+    return hashlib.sha256(json.dumps(details, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class MatchCache:
+    """
+    Job match evaluations per candidate, valid for one job version and one
+    version of the candidate's details. A new job, a status change or newly
+    extracted details make a new key, old entries just expire.
+    """
+
+    def __init__(self, kv: Red, ttl: int = MATCH_TTL):
+        self.logger = Logger("jobs", persist=True)
+        self.kv = kv
+        self.ttl = ttl
+
+    @staticmethod
+    def key(person: str, jobs: str, profile: str) -> str:
+        return f"jobs:match:{person}:{jobs}:{profile}"
+
+    async def get(self, person: str, jobs: Optional[str], profile: str) -> Optional[dict]:
+        """
+        Looks up the evaluation of a candidate against a job version.
+
+        Args:
+            person (str): The candidate's telegram username
+            jobs (str | None): Job version the evaluation has to be for, None when unknown
+            profile (str): profile_version of the candidate's extracted details
+
+        Returns:
+            dict | None: The evaluation, None on a miss
+        """
+        if jobs is None:
+            return None
+        try:
+            cached = await self.kv.red.get(self.key(person, jobs, profile))
+        except Exception as e:
+            self.logger.error(f"failed to read job match of {person}: {e}")
+            return None
+        return json.loads(cached) if cached else None
+
+    async def set(self, person: str, jobs: Optional[str], profile: str, evaluation: dict):
+        """Stores an evaluation, see get for the arguments."""
+        if jobs is None:
+            return
+        try:
+            await self.kv.red.set(self.key(person, jobs, profile), json.dumps(evaluation, default=str), ex=self.ttl)
+        except Exception as e:
+            self.logger.error(f"failed to cache job match of {person}: {e}")
+
+
+class JobIndex:
+    """
+    In-memory TF-IDF index of open jobs, used to shortlist the jobs worth an
+    LLM match evaluation. Each job is a sparse row of log-scaled term
+    frequencies, normalized once when it's indexed, reachable through a
+    posting list per term. A changed job only replaces its own row, and idf is
+    applied when scoring so no other row ever needs updating. Refreshes read
+    only the jobs changed since the last one, and only when the version in
+    Redis moved.
+    """
+
+    def __init__(self, mdb: MDB, kv: Red, status: str = "not started"):
+        """
+        Initialize the JobIndex.
+
+        Args:
+            mdb (MDB): Connected Mongo wrapper
+            kv (Red): Redis wrapper holding the job version
+            status (str, optional): Status of the jobs indexed. Defaults to "not started".
+        """
+        self.logger = Logger("jobs", persist=True)
+        self.mdb = mdb
+        self.kv = kv
+        self.status = status
+        self.lock = asyncio.Lock()
+
+        # insertion ordered, ties rank in the order jobs were indexed
+        self.jobs: dict = {}
+        self.rows: dict = {}
+        self.postings: dict[str, dict] = {}
+        self.version: Optional[str] = None
+        self.watermark: Optional[datetime] = None
+        self.checked = 0.0
+
+    @property
+    def collection(self):
+        return self.mdb.client["job_board"]["jobs"]
+
+    async def refresh(self):
+        """Applies the jobs posted or changed since the last refresh."""
+        try:
+            # never bumped yet counts as a version too
+            version = await self.kv.red.get(VERSION_KEY) or "0"
+        except Exception as e:
+            self.logger.error(f"failed to read job version: {e}")
+            version = None
+        if self.watermark is not None and version == self.version and time.monotonic() - self.checked < REFRESH:
+            return
+
+        async with self.lock:
+            if self.watermark is not None and version == self.version and time.monotonic() - self.checked < REFRESH:
+                return
+
+            started = datetime.now()
+            # the first load takes every open job, later ones what changed since, open or not
+            if self.watermark is None:
+                query = {"status": self.status}
+            else:
+                query = {"updated_at": {"$gte": self.watermark - SKEW}}
+            changed = await self.mdb.run(lambda: list(self.collection.find(query, FIELDS)))
+
+            for job in changed:
+                if job.get("status") == self.status:
+                    self.add(job)
+                else:
+                    self.remove(job["_id"])
+
+            self.version = version
+            self.watermark = started
+            self.checked = time.monotonic()
+            if changed:
+                self.logger.info(f"applied {len(changed)} job changes, {len(self.jobs)} open jobs indexed")
+
+    def add(self, job: dict):
+        """Indexes a job, replacing its previous row if it was indexed already."""
+        self.remove(job["_id"])
+        row = {term: 1 + math.log(count) for term, count in Counter(tokens(text(job))).items()}
+        norm = math.sqrt(sum(weight * weight for weight in row.values())) or 1.0
+        row = {term: weight / norm for term, weight in row.items()}
+        self.jobs[job["_id"]] = job
+        self.rows[job["_id"]] = row
+        for term, weight in row.items():
+            self.postings.setdefault(term, {})[job["_id"]] = weight
+
+    def remove(self, job_id):
+        row = self.rows.pop(job_id, None)
+        if row is None:
+            return
+        del self.jobs[job_id]
+        for term in row:
+            posting = self.postings[term]
+            del posting[job_id]
+            if not posting:
+                del self.postings[term]
+
+    def idf(self, term: str) -> float:
+        return math.log((1 + len(self.jobs)) / (1 + len(self.postings.get(term, ())))) + 1
+
+    def shortlist(self, skills: list[str], k: int = SHORTLIST) -> list[dict]:
+        """
+        Ranks open jobs by TF-IDF similarity to a candidate's skills, idf
+        weighting both sides. Only the posting lists of the skills' terms are
+        read.
+
+        Args:
+            skills (list[str]): The candidate's hard and soft skills
+            k (int, optional): Jobs returned. Defaults to SHORTLIST.
+
+        Returns:
+            list[dict]: Up to k jobs, best first. Without any skill to go on, the first k jobs indexed.
+        """
+        if not self.jobs:
+            return []
+
+        scores = dict.fromkeys(self.jobs, 0.0)
+        for term, count in Counter(tokens(" ".join(skills))).items():
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            weight = (1 + math.log(count)) * self.idf(term) ** 2
+            for job_id, tf in posting.items():
+                scores[job_id] += weight * tf
+        # sorted is stable, so ties keep the order jobs were indexed in
+        best = sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+        return [self.jobs[job_id] for job_id in best]
@@ -0,0 +1,149 @@
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from engine.packages.log import Logger
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+# recent samples kept per histogram for percentiles
+RESERVOIR = 1000
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.samples: deque[float] = deque(maxlen=RESERVOIR)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class Metrics:
+    """
+    Process wide registry of counters and histograms, labelled like prometheus
+    series. Readable as prometheus text, as JSON, or over HTTP with serve().
+    """
+
+    _counters: dict[str, dict[tuple, float]] = {}
+    _histograms: dict[str, dict[tuple, Histogram]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def inc(cls, name: str, value: float = 1, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with cls._lock:
+            series = cls._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    @classmethod
+    def observe(cls, name: str, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with cls._lock:
+            cls._histograms.setdefault(name, {}).setdefault(key, Histogram()).observe(value)
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """
+        Returns every series as plain data, histograms reduced to count, sum and percentiles.
+
+        Returns:
+            dict: {"counters": {name: [...]}, "histograms": {name: [...]}}
+        """
+        with cls._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in cls._counters.items()
+                },
+                "histograms": {
+                    name: [{"labels": dict(key), **hist.snapshot()} for key, hist in series.items()]
+                    for name, series in cls._histograms.items()
+                },
+            }
+
+    @classmethod
+    def dump(cls, path: str):
+        """Writes the snapshot to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(cls.snapshot(), f, indent=2)
+
+    @classmethod
+    def render(cls) -> str:
+        """
+        Renders every series in the prometheus text exposition format.
+
+        Returns:
+            str: The scrape body
+        """
+        def fmt(key: tuple, extra: tuple = ()) -> str:
+            pairs = [f'{k}="{v}"' for k, v in key + extra]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines = []
+        with cls._lock:
+            for name, series in cls._counters.items():
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{fmt(key)} {value}" for key, value in series.items())
+            for name, series in cls._histograms.items():
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in series.items():
+                    running = 0
+                    for bound, count in zip(BUCKETS, hist.counts):
+                        running += count
+                        le = "+Inf" if bound == float("inf") else str(bound)
+                        lines.append(f"{name}_bucket{fmt(key, (('le', le),))} {running}")
+                    lines.append(f"{name}_sum{fmt(key)} {hist.sum}")
+                    lines.append(f"{name}_count{fmt(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def serve(cls, port: int):
+        """
+        Serves /metrics (prometheus) and /metrics.json on a background thread.
+
+        Args:
+            port (int): Port to listen on
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = cls.render(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = json.dumps(cls.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        Logger("metrics", persist=True).info(f"serving metrics on port {port}")
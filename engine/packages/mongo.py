@@ -1,17 +1,24 @@
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from dotenv import load_dotenv
+import asyncio
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 from engine.packages.log import Logger
-from typing import Optional
+from typing import Any, Callable, Optional
 
 load_dotenv()
 
+# threads running blocking calls for async callers, pymongo pools the connections they share
+THREADS = int(os.getenv("MDB_THREADS", 16))
+
 
 class MDB:
     def __init__(self, uri: Optional[str] = None) -> None:
         self.uri: str = uri or os.getenv("MDB_URI") or "mongodb://localhost:27017"
         self.client: Optional[MongoClient] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
         self.logger = Logger("MDB", persist=True)
 
     def connect(self) -> None:
@@ -27,10 +34,32 @@ class MDB:
                 self.logger.error("error connecting to MongoDB")
                 raise e
 
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs a blocking pymongo call on this client's own thread pool, so a slow
+        query holds up only its caller instead of the whole event loop. Calls
+        queue for a thread rather than competing with other to_thread work.
+
+        Args:
+            func (Callable): Blocking call, e.g. collection.find_one
+            *args: Positional arguments of the call
+            **kwargs: Keyword arguments of the call
+
+        Returns:
+            Any: What the call returns
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="mongo")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
     def close(self) -> None:
         """
         Closes the MongoDB connection.
         """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
         if self.client is not None:
             self.client.close()
             self.logger.info("closed connection to MongoDB")
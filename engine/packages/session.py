@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Literal, Optional
+from engine.packages.batch import merge
+from engine.packages.log import Logger
+from engine.packages.states import StateMachine
+
+
+class Session:
+    """
+    Unit of work for one incoming Telegram message. The person is loaded once,
+    and everything the handler changes about them (archived messages, state,
+    extracted details, job match) is collected and written in a single update,
+    conditional on their state when it includes a transition.
+    """
+
+    def __init__(self, states: StateMachine, match: dict):
+        """
+        Initialize the Session.
+
+        Args:
+            states (StateMachine): State machine of the people collection
+            match (dict): Filter for the person, e.g. {"telegram_username": ...}
+        """
+        self.logger = Logger("session", persist=True)
+        self.states = states
+        self.match = match
+        self.update: dict = {}
+        self.transition: Optional[tuple[str, str]] = None
+        self.archived = 0
+
+    async def load(self, projection: Optional[dict] = None) -> Optional[dict]:
+        """Reads the person, None if they don't exist. The projection may use aggregation expressions."""
+        pipeline = [{"$match": self.match}, {"$limit": 1}]
+        if projection:
+            pipeline.append({"$project": projection})
+        return await self.states.mdb.run(lambda: next(self.states.people.aggregate(pipeline), None))
+
+    def archive(self, message: str, author: Literal["nader", "user"]):
+        """Queues a message sent or received for the person's conversation history."""
+        self.update = merge(self.update, {"$push": {"messages": {"author": author, "message": message, "timestamp": datetime.now()}}})
+        self.archived += 1
+
+    def set(self, fields: dict):
+        self.update = merge(self.update, {"$set": fields})
+
+    def unset(self, *fields: str):
+        self.update = merge(self.update, {"$unset": {field: "" for field in fields}})
+
+    def move(self, src: str, dst: str):
+        """Queues a state transition, validated now so a bad one fails before any write."""
+        self.states.prepare(self.match, src, dst)
+        self.transition = (src, dst)
+
+    async def commit(self) -> bool:
+        """
+        Writes everything queued in one update. If the person left the expected
+        state in the meantime, the other changes are still written without the
+        transition.
+
+        Returns:
+            bool: Whether the queued transition happened, True when there was none
+        """
+        if not self.update and self.transition is None:
+            return True
+
+        people = self.states.people
+        moved = True
+        if self.transition is not None:
+            src, dst = self.transition
+            query, update = self.states.prepare(self.match, src, dst, self.update)
+            moved = (await self.states.mdb.run(people.update_one, query, update)).matched_count > 0
+            if moved:
+                self.logger.info(f"moved {self.match} from {src} to {dst}")
+            else:
+                self.logger.error(f"didn't move {self.match} from {src} to {dst}, no longer in {src}")
+        if not moved or self.transition is None:
+            if self.update and (await self.states.mdb.run(people.update_one, self.match, self.update)).matched_count == 0:
+                self.logger.error(f"can't write session for {self.match}, user not found in DB.")
+
+        self.update, self.transition = {}, None
+        return moved
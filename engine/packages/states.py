@@ -0,0 +1,181 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+from engine.packages.batch import WriteBatcher
+from engine.packages.log import Logger
+from engine.packages.mongo import MDB
+
+# seconds a claim on a person holds before another worker may take it over
+LEASE = float(os.getenv("STATE_LEASE", 10 * 60))
+
+# state -> states a person may move to from it
+TRANSITIONS: dict[str, set[str]] = {
+    # telegram onboarding
+    "start": {"referred"},
+    "referred": {"gathering"},
+    # twitter outreach
+    "seed": {"gathering"},
+    # twitter candidates go on to testing, telegram ones to ready
+    "gathering": {"gathering", "testing", "stalled", "ready"},
+    "testing": {"accepted", "rejected"},
+}
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def owner() -> str:
+    """Identifies this process as the holder of a claim."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class StateMachine:
+    """
+    Moves people documents between states. A worker claims a person in an
+    expected state with a lease before processing them, and every state change
+    is a single conditional update on the expected state, so replicas of the
+    orchestrator or the bot can't process or move the same person twice.
+    """
+
+    def __init__(
+        self,
+        mdb: MDB,
+        owner: Optional[str] = None,
+        lease: float = LEASE,
+        batch: Optional[WriteBatcher] = None,
+    ):
+        """
+        Initialize the StateMachine.
+
+        Args:
+            mdb (MDB): Connected Mongo wrapper, people live in network.people
+            owner (str, optional): Name claims are taken under, None for writers that never claim
+            lease (float, optional): Seconds a claim holds. Defaults to LEASE.
+            batch (WriteBatcher, optional): Write-behind batcher release() queues its writes on
+        """
+        self.logger = Logger("states", persist=True)
+        self.mdb = mdb
+        self.owner = owner
+        self.lease = lease
+        self.batch = batch
+        # people whose lease a move already dropped, their release is a no-op
+        self.moved: set = set()
+
+    @property
+    def people(self):
+        return self.mdb.client["network"]["people"]
+
+    @staticmethod
+    def allowed(src: str, dst: str) -> bool:
+        return dst in TRANSITIONS.get(src, ())
+
+    async def claim(self, person_id, state: str, projection: Optional[dict] = None) -> Optional[dict]:
+        """
+        Takes the lease on a person if they are still in a state and nobody else holds it.
+
+        Args:
+            person_id (ObjectId): The person's _id
+            state (str): State the person is expected to be in
+            projection (dict, optional): Fields to return
+
+        Returns:
+            Optional[dict]: The claimed person, None if they moved on or are claimed elsewhere
+        """
+        now = datetime.now()
+        return await self.mdb.run(
+            self.people.find_one_and_update,
+            {
+                "_id": person_id,
+                "state": state,
+                "$or": [{"lease": None}, {"lease.until": {"$lt": now}}],
+            },
+            {"$set": {"lease": {"owner": self.owner, "until": now + timedelta(seconds=self.lease)}}},
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def release(self, person_id):
+        """Drops this worker's lease on a person, if it still holds it."""
+        if self.batch is None:
+            await self.mdb.run(self.people.update_one, {"_id": person_id, "lease.owner": self.owner}, {"$unset": {"lease": ""}})
+            return
+        # a queued release would land after the next claim and drop that lease instead
+        if person_id in self.moved:
+            self.moved.discard(person_id)
+            return
+        # a queued write already drops the lease, e.g. a recorded failure
+        if "lease" in (self.batch.queued(person_id) or {}).get("$unset", {}):
+            return
+        await self.batch.add({"_id": person_id, "lease.owner": self.owner}, {"$unset": {"lease": ""}})
+
+    def prepare(self, match: dict, src: str, dst: str, update: Optional[dict] = None) -> tuple[dict, dict]:
+        """
+        Builds the conditional write moving a person from one state to another.
+
+        Args:
+            match (dict): Filter for the person, e.g. {"_id": ...} or {"telegram_username": ...}
+            src (str): State the person is expected to be in
+            dst (str): State to move them to
+            update (dict, optional): Other update operators to apply along with the move
+
+        Returns:
+            tuple[dict, dict]: The filter and update document
+
+        Raises:
+            InvalidTransition: If the transition isn't declared in TRANSITIONS
+        """
+        if not self.allowed(src, dst):
+            raise InvalidTransition(f"can't move a person from {src} to {dst}")
+
+        query = {**match, "state": src}
+        if self.owner is not None:
+            query["lease.owner"] = self.owner
+
+        now = datetime.now()
+        update = {op: dict(fields) for op, fields in (update or {}).items()}
+        update.setdefault("$set", {})["state"] = dst
+        if src != dst:
+            update["$set"]["state_at"] = now
+            update.setdefault("$push", {})["state_history"] = {"from": src, "to": dst, "at": now}
+        if self.owner is not None:
+            update.setdefault("$unset", {})["lease"] = ""
+        return query, update
+
+    def transition(self, match: dict, src: str, dst: str, update: Optional[dict] = None) -> bool:
+        """
+        Moves a person from one state to another, applying any other changes in the same write.
+        See prepare for the arguments.
+
+        Returns:
+            bool: Whether the person was moved, False if they weren't in src anymore
+                or a worker claiming under this owner lost its lease
+        """
+        query, update = self.prepare(match, src, dst, update)
+        result = self.people.update_one(query, update)
+        if result.matched_count == 0:
+            self.logger.error(f"didn't move {match} from {src} to {dst}, no longer in {src} or not claimed by {self.owner}")
+            return False
+        if src != dst:
+            self.logger.info(f"moved {match} from {src} to {dst}")
+        return True
+
+    async def move(self, match: dict, src: str, dst: str, update: Optional[dict] = None) -> bool:
+        """
+        Like transition, without blocking the loop. Moves aren't batched: a bulk
+        write only reports how many of its filters matched overall, and whether
+        this one did, i.e. the person was still in src under this owner's lease,
+        is what callers need to know. What's queued for the person on the write
+        batcher goes out first so their writes land in order.
+
+        Returns:
+            bool: Whether the person was moved, see transition
+        """
+        if self.batch is not None and self.batch.queued(match.get("_id")) is not None:
+            await self.batch.flush()
+        moved = await self.mdb.run(self.transition, match, src, dst, update)
+        if moved and self.owner is not None and self.batch is not None:
+            self.moved.add(match.get("_id"))
+        return moved
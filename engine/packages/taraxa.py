@@ -1,12 +1,15 @@
 import os
+import asyncio
 import csv
 import json
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from collections import Counter, defaultdict
 from datetime import datetime
+from engine.agent.character import CharacterStore
 from engine.packages.log import Logger
 from engine.packages.mongo import MDB
+from engine.packages.red import Red
 
 class TaraxaProcessor:
     """
@@ -18,6 +21,8 @@ class TaraxaProcessor:
         self.logger = Logger("taraxa", persist=True)
         self.mdb = MDB()
         self.collection_name = "telegram_insights"
+        # broadcasts scheduled on a running loop, referenced until they finish
+        self.broadcasts: set[asyncio.Task] = set()
         
     def process_csv(self, csv_path: str) -> Dict[str, Any]:
         """
@@ -344,16 +349,46 @@ class TaraxaProcessor:
                 if slang_style not in character["style"]["chat"]:
                     character["style"]["chat"].append(slang_style)
             
-            # Save enhanced character
-            with open(character_path, 'w') as f:
+            # Save enhanced character atomically, running agents pick it up by mtime
+            tmp_path = f"{character_path}.tmp"
+            with open(tmp_path, 'w') as f:
                 json.dump(character, f, indent=2)
+            os.replace(tmp_path, character_path)
             
             self.logger.info(f"Enhanced character with Telegram insights: {character_path}")
+            
+            # Agents on other hosts don't share the file, they get it over redis
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            try:
+                if loop:
+                    # asyncio.run can't nest, inside a running loop the broadcast is scheduled on it
+                    task = loop.create_task(self._broadcast(character))
+                    self.broadcasts.add(task)
+                    task.add_done_callback(self._broadcasted)
+                else:
+                    asyncio.run(self._broadcast(character))
+            except Exception as e:
+                self.logger.error(f"Error broadcasting enhanced character: {str(e)}")
             return character
             
         except Exception as e:
             self.logger.error(f"Error enhancing character: {str(e)}")
             return {}
+    
+    async def _broadcast(self, character: Dict[str, Any]):
+        kv = Red()
+        try:
+            await CharacterStore.publish(kv, character)
+        finally:
+            await kv.red.aclose()
+
+    def _broadcasted(self, task: asyncio.Task):
+        self.broadcasts.discard(task)
+        if not task.cancelled() and task.exception():
+            self.logger.error(f"Error broadcasting enhanced character: {str(task.exception())}")
 
 # Example usage
 if __name__ == "__main__":
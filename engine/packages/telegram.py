@@ -1,21 +1,52 @@
 import asyncio
 import os
+import sys
 import textwrap
 from typing import Literal
 from engine.agent.index import AI
+from engine.agent.stream import partial_field
+from engine.agent.prompt import PromptBuilder
+from engine.agent.summary import Summarizer
 from engine.packages.log import Logger
 from engine.packages.mongo import MDB
 from engine.packages.red import Red
+from engine.packages.metrics import Metrics
+from engine.packages.states import StateMachine
+from engine.packages.session import Session
+from engine.packages.jobs import JobIndex, MatchCache, SHORTLIST, bump_version, profile_version
+from engine.packages import indexes
 from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from telegram.ext import ApplicationBuilder, BaseUpdateProcessor, CommandHandler, MessageHandler, filters, ContextTypes
 import dotenv
-import json
-import time
 from datetime import datetime
 from telegram.ext import CommandHandler, MessageHandler, filters
 
 dotenv.load_dotenv()
 
+# minimum seconds between edits of a streamed reply, telegram throttles faster edits per chat
+EDIT_INTERVAL = 1.0
+# tries at the final edit of a streamed reply, the progressive ones before it only get one
+EDIT_ATTEMPTS = 3
+# latest messages of a conversation that get first claim on the prompt budget
+RECENT_TURNS = 10
+# updates handled at once across users, those waiting on their user's earlier ones don't count
+UPDATE_CONCURRENCY = int(os.getenv("TELEGRAM_CONCURRENCY", 256))
+# LLM calls in flight at once across every conversation, summaries included
+LLM_CONCURRENCY = int(os.getenv("TELEGRAM_LLM_CONCURRENCY", 8))
+
+# newest archived messages loaded per update, the summarizer keeps far fewer than this uncovered
+HISTORY = int(os.getenv("TELEGRAM_HISTORY", 50))
+
+# fields the message handlers read, the twitter side's dm and tweets never load. only the
+# newest messages come along, with the conversation's length to line them up with the summary
+PROFILE = {
+    "telegram_username": 1, "state": 1, "extracted_details": 1,
+    "current_job_match": 1, "summary": 1,
+    "messages": {"$slice": [{"$ifNull": ["$messages", []]}, -HISTORY]},
+    "message_count": {"$size": {"$ifNull": ["$messages", []]}},
+}
+
 prompts = {
     "welcome": textwrap.dedent("""
         Yo. I'm NaderAI, and I'm building a private network of the most cracked blockchain builders in the world.
@@ -169,18 +200,74 @@ prompts = {
     """),
 }
 
+class UserOrdered(BaseUpdateProcessor):
+    """
+    Handles updates of different users concurrently and each user's updates
+    one at a time in the order they arrived, so replies and state changes of a
+    conversation never interleave.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        # process_update holds the base class' slot for all of do_process_update, so
+        # an update waiting on its user's lock would hold one too. that limit is left
+        # open and the real one is taken only once it's the update's turn
+        super().__init__(sys.maxsize)
+        self.slots = asyncio.Semaphore(max_concurrent_updates)
+        self.locks: dict[int, asyncio.Lock] = {}
+        self.waiting: dict[int, int] = {}
+
+    async def do_process_update(self, update, coroutine):
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            async with self.slots:
+                await coroutine
+            return
+
+        # updates start in arrival order and the lock hands over first come first served
+        lock = self.locks.setdefault(user.id, asyncio.Lock())
+        self.waiting[user.id] = self.waiting.get(user.id, 0) + 1
+        try:
+            async with lock, self.slots:
+                await coroutine
+        finally:
+            self.waiting[user.id] -= 1
+            if not self.waiting[user.id]:
+                del self.waiting[user.id], self.locks[user.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
 class TEL:
-    def __init__(self):
+    def __init__(self, mdb=None, kv=None, ai=None):
         self.logger = Logger("TEL", persist=True)
-        self.kv = Red()
-        self.mdb = MDB()
+        self.kv = kv or Red()
+        self.mdb = mdb or MDB()
         self.mdb.connect()
-        self.ai = AI()
-        self.app = ApplicationBuilder().token(os.getenv("TELEGRAM_TOKEN") or "").build()
+        indexes.ensure(self.mdb)
+        # the bot only moves people on their own messages, so it never claims them
+        self.states = StateMachine(self.mdb)
+        self.ai = ai or AI()
+        self.llm = asyncio.Semaphore(LLM_CONCURRENCY)
+        self.board = JobIndex(self.mdb, self.kv)
+        self.matches = MatchCache(self.kv)
+        self.summarizer = Summarizer(self.ai, self.mdb, keep=RECENT_TURNS, limit=self.llm)
+        self.streaming = os.getenv("TELEGRAM_STREAMING", "1") != "0"
+        self.app = (
+            ApplicationBuilder()
+            .token(os.getenv("TELEGRAM_TOKEN") or "")
+            .concurrent_updates(UserOrdered(UPDATE_CONCURRENCY))
+            .build()
+        )
 
     def run(self):
         """Run the bot until the application is stopped."""
         self.setup()
+        if os.getenv("METRICS_PORT"):
+            Metrics.serve(int(os.getenv("METRICS_PORT") or 0))
         self.logger.info("starting bot polling")
         self.app.run_polling()
 
@@ -217,13 +304,14 @@ class TEL:
         db = self.mdb.client["network"]
         people = db["people"]
         
-        if people.find_one({"telegram_username": telegram_username}):
+        if await self.mdb.run(people.find_one, {"telegram_username": telegram_username}, {"_id": 1}):
             self.logger.info(f"user {telegram_username} already exists, skipping")
             return
         
         await update.message.reply_text(prompts["welcome"])
         
-        people.insert_one(
+        await self.mdb.run(
+            people.insert_one,
             {
                 "telegram_username": telegram_username,
                 "state": "start",
@@ -262,7 +350,7 @@ class TEL:
         db = self.mdb.client["network"]
         people = db["people"]
         
-        existing_user = people.find_one({"telegram_username": telegram_username})
+        existing_user = await self.mdb.run(people.find_one, {"telegram_username": telegram_username}, {"_id": 1})
         if not existing_user:
             self.logger.info(
                 f"user {telegram_username} not found in DB. "
@@ -273,7 +361,7 @@ class TEL:
             )
             return
 
-        existing_referrer = people.find_one({"telegram_username": referred_by})
+        existing_referrer = await self.mdb.run(people.find_one, {"telegram_username": referred_by}, {"_id": 1})
         if not existing_referrer:
             self.logger.info(
                 f"referrer {referred_by} does not exist in the network, skipping."
@@ -287,18 +375,24 @@ class TEL:
         #    For now, we'll just record it. If you store valid codes or track usage,
         #    you'll want to validate that `referral_code` belongs to `existing_referrer`.
         
-        update_result = people.update_one(
+        referred = await self.mdb.run(
+            self.states.transition,
             {"telegram_username": telegram_username},
+            "start",
+            "referred",
             {
                 "$set": {
                     "referred": True,
                     "referred_by": referred_by,
                     "referral_code": referral_code,
                     "referred_at": datetime.now(),
-                    "state": "referred"
                 }
             }
         )
+        if not referred:
+            self.logger.info(f"user {telegram_username} was already referred, skipping")
+            await update.message.reply_text("You're already in. Just tell me what you're working on.")
+            return
 
         self.logger.info(
             f"User {telegram_username} was updated as referred by {referred_by} "
@@ -309,20 +403,15 @@ class TEL:
         details = f"User: {telegram_username}\nReferred by: {referred_by}"
         full = base + details
         
-        opener = await self.ai.act(full)
-        res = opener["response"]
-        try:
-            if isinstance(res, str): 
-                msg = json.loads(res)['message']
-            else: 
-                msg = res['message']
-        except Exception as e:
-            self.logger.error(f"Failed to parse AI response in refer: {str(e)}. Response: {res}")
-            msg = "Hey, our dev fucked up some code and I couldn't parse that. Welcome to the network though! Tell me a bit about yourself and what you're working on."
+        msg, _ = await self.respond(
+            update,
+            full,
+            "reffered",
+            "Hey, our dev fucked up some code and I couldn't parse that. Welcome to the network though! Tell me a bit about yourself and what you're working on.",
+        )
         
-        self.logger.info(f"welcoming user with message: {msg}")
+        self.logger.info(f"welcomed user with message: {msg}")
         
-        await update.message.reply_text(msg)
         await self.archive(msg, "nader", telegram_username)
         
     async def process(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -337,62 +426,64 @@ class TEL:
         
         self.logger.info(f"received message from {telegram_username} with content: {update.message.text}")
         
-        # query the users state from the database
-        db = self.mdb.client["network"]
-        people = db["people"]
-        
-        existing_user = people.find_one({"telegram_username": telegram_username})
+        # one read and one write per message, changes are queued on the session meanwhile
+        session = Session(self.states, {"telegram_username": telegram_username})
+        existing_user = await session.load(PROFILE)
         if not existing_user:
             self.logger.info(
                 f"can't process message for {telegram_username}, user not found in DB."
             )
             return
         
+        try:
+            await self.handle(update, session, existing_user)
+        finally:
+            await session.commit()
+            if session.archived:
+                self.summarizer.schedule(telegram_username)
+    
+    async def handle(self, update: Update, session: Session, existing_user: dict):
+        """
+        Replies to a message according to the user's state, queueing every
+        change to the user on the session.
+        
+        Args:
+            update (Update): The incoming message
+            session (Session): The message's unit of work
+            existing_user (dict): The user's document, loaded with PROFILE
+        """
+        telegram_username = existing_user["telegram_username"]
         state = existing_user.get("state")
         if state == "referred":
-            await self.archive(update.message.text, "user", telegram_username)
+            session.archive(update.message.text, "user")
             
             base = prompts["inquire"]
             details = textwrap.dedent(f"""
                 HERE'S WHAT YOU KNOW ABOUT THIS CANDIDATE:
                 User: {telegram_username}
                 Most Recent Message: {update.message.text}
-                Prior Messages: {existing_user.get("messages")}
             """)
             
-            full = base + details
+            full = self.compose(base + details, existing_user)
             self.logger.info(f"processing message for {telegram_username} in state {state}")
-            opener = await self.ai.act(full)
-            res = opener["response"]
-            print(res)
-            try:
-                if isinstance(res, str):
-                    response_data = json.loads(res)
-                    msg = response_data['message']
-                    action = response_data.get('action')
-                else:
-                    msg = res['message']
-                    action = res.get('action')
-            except (json.JSONDecodeError, KeyError) as e:
-                self.logger.error(f"Failed to parse AI response: {str(e)}. Response: {res}")
-                # Fallback message
-                msg = "Hey, our dev fucked up some code and I couldn't parse that. Can you pretty please send what you said again? I promise I'm usually smarter than this."
-                action = None
+            msg, response_data = await self.respond(
+                update,
+                full,
+                "inquire",
+                "Hey, our dev fucked up some code and I couldn't parse that. Can you pretty please send what you said again? I promise I'm usually smarter than this.",
+            )
+            action = response_data.get('action')
             
-            self.logger.info(f"responding to user with message: {msg}")
+            self.logger.info(f"responded to user with message: {msg}")
             
-            await update.message.reply_text(msg)
-            await self.archive(msg, "nader", telegram_username)
+            session.archive(msg, "nader")
             
             # Update user state if action is "pass"
             if action == "pass":
-                people.update_one(
-                    {"telegram_username": telegram_username},
-                    {"$set": {"state": "gathering"}}
-                )
+                session.move("referred", "gathering")
                 self.logger.info(f"User {telegram_username} passed vibe check, moved to gathering state")
         elif state == "gathering":
-            await self.archive(update.message.text, "user", telegram_username)
+            session.archive(update.message.text, "user")
             
             # Get existing extracted details if any
             extracted_details = existing_user.get("extracted_details", {})
@@ -406,7 +497,6 @@ class TEL:
                 HERE'S WHAT YOU KNOW ABOUT THIS CANDIDATE:
                 User: {telegram_username}
                 Most Recent Message: {update.message.text}
-                Prior Messages: {existing_user.get("messages")}
                 
                 EXTRACTED DETAILS SO FAR:
                 GitHub: {github}
@@ -415,32 +505,24 @@ class TEL:
                 Hard Skills: {hard_skills}
             """)
             
-            full = base + details
+            full = self.compose(base + details, existing_user)
             self.logger.info(f"processing gathering message for {telegram_username}")
             
-            opener = await self.ai.act(full)
-            res = opener["response"]
-            
-            try:
-                if isinstance(res, str):
-                    response_data = json.loads(res)
-                    msg = response_data['message']
-                    extracted = response_data.get('extracted', {})
-                else:
-                    msg = res['message']
-                    extracted = res.get('extracted', {})
-            except Exception as e:
-                self.logger.error(f"Failed to parse AI response in gathering: {str(e)}. Response: {res}")
-                msg = "Hey, our dev fucked up some code and I couldn't parse that. Can you pretty please send what you said again? I promise I'm usually smarter than this."
-                extracted = {}
+            msg, response_data = await self.respond(
+                update,
+                full,
+                "gathering",
+                "Hey, our dev fucked up some code and I couldn't parse that. Can you pretty please send what you said again? I promise I'm usually smarter than this.",
+            )
+            extracted = response_data.get('extracted') or {}
             
-            self.logger.info(f"responding to user with message: {msg}")
+            self.logger.info(f"responded to user with message: {msg}")
             
             # Update extracted details with any new information
             new_github = extracted.get('github')
             new_email = extracted.get('email')
-            new_soft = extracted.get('soft', [])
-            new_hard = extracted.get('hard', [])
+            new_soft = extracted.get('soft') or []
+            new_hard = extracted.get('hard') or []
             
             # Only update if new values are found
             update_data = {}
@@ -464,14 +546,6 @@ class TEL:
                 update_data["extracted_details.hard"] = combined_hard
                 self.logger.info(f"Updated hard skills: {combined_hard}")
             
-            # If we have updates to make
-            if update_data:
-                people.update_one(
-                    {"telegram_username": telegram_username},
-                    {"$set": update_data}
-                )
-                self.logger.info(f"Updated extracted details for {telegram_username}")
-            
             # If we have both GitHub and email, and at least 3 skills total, consider moving to next stage
             has_github = github or new_github
             has_email = email or new_email
@@ -479,15 +553,14 @@ class TEL:
             
             if has_github and has_email and total_skills >= 5:
                 self.logger.info(f"User {telegram_username} has provided all necessary information and is ready to be matched")
-                people.update_one(
-                    {"telegram_username": telegram_username},
-                    {"$set": {"state": "ready"}}
-                )
+                session.move("gathering", "ready")
+            if update_data:
+                session.set(update_data)
+                self.logger.info(f"Updated extracted details for {telegram_username}")
             
-            await update.message.reply_text(msg)
-            await self.archive(msg, "nader", telegram_username)
+            session.archive(msg, "nader")
         elif state == "ready":
-            await self.archive(update.message.text, "user", telegram_username)
+            session.archive(update.message.text, "user")
             
             # Get user details for context
             extracted_details = existing_user.get("extracted_details", {})
@@ -506,7 +579,7 @@ class TEL:
                 # Get the job details
                 job_board = self.mdb.client["job_board"]
                 jobs = job_board["jobs"]
-                job = jobs.find_one({"_id": job_id})
+                job = await self.mdb.run(jobs.find_one, {"_id": job_id}, {"calComLink": 1, "companyName": 1})
                 
                 if job:
                     cal_link = job.get("calComLink", "No calendar link available")
@@ -514,19 +587,18 @@ class TEL:
                     
                     msg = f"Great! Here's the calendar link to schedule a call with {company}: {cal_link}"
                     await update.message.reply_text(msg)
-                    await self.archive(msg, "nader", telegram_username)
+                    session.archive(msg, "nader")
                     
                     # Update user to remove the provide_link_next flag
-                    people.update_one(
-                        {"telegram_username": telegram_username},
-                        {"$unset": {"current_job_match.provide_link_next": ""}}
-                    )
+                    session.unset("current_job_match.provide_link_next")
                     
                     # Update job status
-                    jobs.update_one(
+                    await self.mdb.run(
+                        jobs.update_one,
                         {"_id": job_id},
-                        {"$set": {"status": "in progress"}}
+                        {"$set": {"status": "in progress", "updated_at": datetime.now()}}
                     )
+                    await bump_version(self.kv)
                     return
             
             # Check for potential job matches if user isn't already in a job matching conversation
@@ -535,51 +607,56 @@ class TEL:
                 job_board = self.mdb.client["job_board"]
                 jobs = job_board["jobs"]
                 
-                # Find jobs with status "not started"
-                available_jobs = list(jobs.find({"status": "not started"}))
+                # only the open jobs closest to their skills go to the LLM, however many are posted
+                await self.board.refresh()
+                available_jobs = self.board.shortlist(hard_skills + soft_skills, SHORTLIST)
                 
                 if available_jobs:
-                    # Format jobs for the AI
-                    jobs_formatted = []
-                    for job in available_jobs:
-                        jobs_formatted.append(f"""
-                        Job ID: {job['_id']}
-                        Company: {job.get('companyName', 'Unknown')}
-                        Company Description: {job.get('companyDescription', 'No description available')}
-                        Job Description: {job.get('jobDescription', 'No description available')}
-                        """)
+                    # the last evaluation holds until a job is posted or closed, or their details change
+                    version = self.board.version
+                    profile = profile_version(extracted_details)
+                    eval_data = await self.matches.get(telegram_username, version, profile)
+                    Metrics.inc("job_match_cache_total", result="miss" if eval_data is None else "hit")
                     
-                    # Get message history for context
-                    message_history = existing_user.get("messages", [])
-                    message_history_formatted = []
-                    for msg in message_history[-10:]:  # Get last 10 messages for context
-                        message_history_formatted.append(f"{msg['author']}: {msg['message']}")
-                    
-                    # Use AI to evaluate job matches
-                    job_match_eval_prompt = prompts["job_match_evaluation"].format(
-                        github=github,
-                        email=email,
-                        soft_skills=soft_skills,
-                        hard_skills=hard_skills,
-                        message_history="\n".join(message_history_formatted),
-                        available_jobs="\n\n".join(jobs_formatted)
-                    )
-                    
-                    self.logger.info(f"Evaluating job matches for {telegram_username}")
-                    job_match_eval = await self.ai.act(job_match_eval_prompt)
-                    eval_res = job_match_eval["response"]
-                    
-                    try:
-                        if isinstance(eval_res, str):
-                            eval_data = json.loads(eval_res)
-                        else:
-                            eval_data = eval_res
-                    except Exception as e:
-                        self.logger.error(f"Failed to parse job match evaluation response: {str(e)}. Response: {eval_res}")
-                        eval_data = {"match_found": False}
-                        await update.message.reply_text("I was trying to find job matches for you, but our dev's code is acting up. Let's chat more and I'll try again later!")
-                        await self.archive("I was trying to find job matches for you, but our dev's code is acting up. Let's chat more and I'll try again later!", "nader", telegram_username)
-                        return
+                    if eval_data is None:
+                        # Format jobs for the AI
+                        jobs_formatted = []
+                        for job in available_jobs:
+                            jobs_formatted.append(f"""
+                            Job ID: {job['_id']}
+                            Company: {job.get('companyName', 'Unknown')}
+                            Company Description: {job.get('companyDescription', 'No description available')}
+                            Job Description: {job.get('jobDescription', 'No description available')}
+                            """)
+                        
+                        # Get message history for context
+                        message_history = existing_user.get("messages", [])
+                        message_history_formatted = []
+                        for msg in message_history[-10:]:  # Get last 10 messages for context
+                            message_history_formatted.append(f"{msg['author']}: {msg['message']}")
+                        
+                        # Use AI to evaluate job matches
+                        job_match_eval_prompt = prompts["job_match_evaluation"].format(
+                            github=github,
+                            email=email,
+                            soft_skills=soft_skills,
+                            hard_skills=hard_skills,
+                            message_history="\n".join(message_history_formatted),
+                            available_jobs="\n\n".join(jobs_formatted)
+                        )
+                        
+                        self.logger.info(f"Evaluating job matches for {telegram_username}")
+                        async with self.llm:
+                            job_match_eval = await self.ai.act(job_match_eval_prompt, key="job_match_evaluation")
+                        
+                        if job_match_eval["status"] != "success":
+                            self.logger.error(f"Failed to evaluate job matches for {telegram_username}")
+                            await update.message.reply_text("I was trying to find job matches for you, but our dev's code is acting up. Let's chat more and I'll try again later!")
+                            session.archive("I was trying to find job matches for you, but our dev's code is acting up. Let's chat more and I'll try again later!", "nader")
+                            return
+                        
+                        eval_data = job_match_eval["response"]
+                        await self.matches.set(telegram_username, version, profile, eval_data)
                     
                     match_found = eval_data.get("match_found", False)
                     
@@ -596,16 +673,11 @@ class TEL:
                         
                         if matched_job:
                             # Store the current job match in the user's record
-                            people.update_one(
-                                {"telegram_username": telegram_username},
-                                {"$set": {
-                                    "current_job_match": {
-                                        "job_id": matched_job["_id"],
-                                        "presented_at": datetime.now(),
-                                        "match_reason": match_reason
-                                    }
-                                }}
-                            )
+                            current_job_match = {
+                                "job_id": matched_job["_id"],
+                                "presented_at": datetime.now(),
+                                "match_reason": match_reason
+                            }
                             
                             # Prepare job match message
                             job_match_base = prompts["job_match"]
@@ -626,23 +698,17 @@ class TEL:
                                 {match_reason}
                                 
                                 Most Recent Message: {update.message.text}
-                                Prior Messages: {existing_user.get("messages")}
                             """)
                             
-                            job_match_full = job_match_base + job_match_details
-                            job_match_response = await self.ai.act(job_match_full)
-                            job_match_res = job_match_response["response"]
+                            job_match_full = self.compose(job_match_base + job_match_details, existing_user)
+                            async with self.llm:
+                                job_match_response = await self.ai.act(job_match_full, key="job_match")
                             
-                            try:
-                                if isinstance(job_match_res, str):
-                                    response_data = json.loads(job_match_res)
-                                    msg = response_data['message']
-                                    provide_link = response_data.get('provide_link', False)
-                                else:
-                                    msg = job_match_res['message']
-                                    provide_link = job_match_res.get('provide_link', False)
-                            except Exception as e:
-                                self.logger.error(f"Failed to parse AI response in job match: {str(e)}. Response: {job_match_res}")
+                            if job_match_response["status"] == "success":
+                                msg = job_match_response["response"]['message']
+                                provide_link = job_match_response["response"].get('provide_link', False)
+                            else:
+                                self.logger.error(f"Failed to present job match to {telegram_username}")
                                 msg = "I found a potential job match for you, but my circuits got a bit fried trying to process it. Can you send a quick reply so I can try again? Our dev is getting fired as we speak."
                                 provide_link = False
                             
@@ -654,19 +720,19 @@ class TEL:
                                 msg += f"\n\nHere's the calendar link to schedule a call: {cal_link}"
                                 
                                 # Update job status
-                                jobs.update_one(
+                                await self.mdb.run(
+                                    jobs.update_one,
                                     {"_id": matched_job["_id"]},
-                                    {"$set": {"status": "in progress"}}
+                                    {"$set": {"status": "in progress", "updated_at": datetime.now()}}
                                 )
+                                await bump_version(self.kv)
                             else:
                                 # Set flag to provide link in next message if user expresses interest
-                                people.update_one(
-                                    {"telegram_username": telegram_username},
-                                    {"$set": {"current_job_match.provide_link_next": True}}
-                                )
+                                current_job_match["provide_link_next"] = True
+                            session.set({"current_job_match": current_job_match})
                             
                             await update.message.reply_text(msg)
-                            await self.archive(msg, "nader", telegram_username)
+                            session.archive(msg, "nader")
                             return
             
             # If no job match or user is already in a job matching conversation, continue normal conversation
@@ -680,28 +746,168 @@ class TEL:
                 Hard Skills: {hard_skills}
                 
                 Most Recent Message: {update.message.text}
-                Prior Messages: {existing_user.get("messages")}
             """)
             
-            full = base + details
+            full = self.compose(base + details, existing_user)
             self.logger.info(f"processing message for {telegram_username} in ready state")
             
-            response = await self.ai.act(full)
-            res = response["response"]
+            msg, _ = await self.respond(
+                update,
+                full,
+                "ready",
+                "Oops, our dev messed up some code and I couldn't process that properly. Mind sending your message again? I promise we're usually more put together than this.",
+            )
             
-            try:
-                if isinstance(res, str):
-                    msg = json.loads(res)['message']
-                else:
-                    msg = res['message']
-            except Exception as e:
-                self.logger.error(f"Failed to parse AI response in ready state: {str(e)}. Response: {res}")
-                msg = "Oops, our dev messed up some code and I couldn't process that properly. Mind sending your message again? I promise we're usually more put together than this."
+            self.logger.info(f"responded to ready user with message: {msg}")
             
-            self.logger.info(f"responding to ready user with message: {msg}")
+            session.archive(msg, "nader")
+    
+    def compose(self, prompt: str, user: dict) -> str:
+        """
+        Appends a user's conversation to a prompt within the token budget: the
+        rolling summary, then the messages it doesn't cover yet. The most recent
+        turns are kept first, older history only fills what's left.
+        
+        Args:
+            prompt (str): The base prompt and candidate details
+            user (dict): The user's document with summary and archived messages, loaded with PROFILE
             
+        Returns:
+            str: The full prompt
+        """
+        summary = user.get("summary") or {}
+        messages = user.get("messages") or []
+        # only the newest messages are loaded, the first of them is this far into the conversation
+        offset = user.get("message_count", len(messages)) - len(messages)
+        messages = messages[max(0, summary.get("covered", 0) - offset):]
+        turns = [f"{m.get('author')}: {m.get('message')}" for m in messages]
+        builder = PromptBuilder().fixed(prompt)
+        if summary.get("text"):
+            builder.fixed(f"Conversation Summary So Far:\n{summary['text']}")
+        builder.section("Older Messages", turns[:-RECENT_TURNS], priority=2, keep="last")
+        builder.section("Prior Messages", turns[-RECENT_TURNS:], priority=0, keep="last")
+        return builder.build()
+    
+    async def respond(self, update: Update, content: str, key: str, fallback: str):
+        """
+        Generates the agent's reply to a message and sends it to the user.
+        
+        When streaming, a placeholder goes out right away and is edited as the
+        "message" field of the completion grows. Edits are coalesced to one per
+        EDIT_INTERVAL to stay inside Telegram's edit limits.
+        
+        Args:
+            update (Update): The update being replied to
+            content (str): The full prompt for the agent
+            key (str): Prompt key the content was built from
+            fallback (str): Message sent if the completion can't be parsed
+            
+        Returns:
+            tuple[str, dict]: The message sent and the full parsed response ({} on failure)
+        """
+        if update.message is None:
+            return fallback, {}
+        
+        if not self.streaming:
+            async with self.llm:
+                res = await self.ai.act(content, key=key)
+            if res["status"] == "success":
+                data = res["response"]
+                msg = data['message']
+            else:
+                data, msg = {}, fallback
             await update.message.reply_text(msg)
-            await self.archive(msg, "nader", telegram_username)
+            return msg, data
+        
+        placeholder = await update.message.reply_text("...")
+        buffer = ""
+        latest = shown = "..."
+        streamed = asyncio.Event()
+        
+        async def show():
+            # edits run beside the stream, so flood control waits never hold an LLM slot
+            nonlocal shown
+            while not streamed.is_set():
+                try:
+                    await asyncio.wait_for(streamed.wait(), EDIT_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                if not streamed.is_set() and latest.strip() and latest != shown:
+                    text = latest
+                    if await self.edit(placeholder, text):
+                        shown = text
+        
+        editor = asyncio.create_task(show())
+        truncated = False
+        try:
+            async with self.llm:
+                async for delta in self.ai.stream(content, key=key):
+                    buffer += delta
+                    latest = partial_field(buffer, "message") or latest
+        except Exception as e:
+            self.logger.error(f"streaming {key} failed, completing it without streaming: {str(e)}")
+            truncated = True
+        finally:
+            streamed.set()
+        await editor
+        
+        if truncated:
+            # whatever streamed is cut off, the whole reply comes from a regular completion
+            async with self.llm:
+                res = await self.ai.act(content, key=key)
+            data = res["response"] if res["status"] == "success" else {}
+        else:
+            data, problems = self.ai.structured.parse(buffer, key)
+            if problems and buffer:
+                try:
+                    async with self.llm:
+                        data = await self.ai.repair(content, buffer, problems, key)
+                except Exception as e:
+                    self.logger.error(f"Failed to repair streamed AI response in {key}: {str(e)}")
+                    # the message already went out, nothing else of an invalid response is trusted
+                    data = {"message": data.get("message")} if isinstance(data, dict) else {}
+        if not isinstance(data, dict) or not data.get('message'):
+            data = {}
+        msg = data.get('message') or fallback
+        
+        if msg != shown:
+            await self.edit(placeholder, msg, final=True)
+        return msg, data
+    
+    async def edit(self, message, text: str, final: bool = False) -> bool:
+        """
+        Edits a sent message. Progressive edits are best effort, a failed one is
+        skipped and the next carries newer text. The final edit waits out flood
+        control and transient errors, up to EDIT_ATTEMPTS tries.
+        
+        Args:
+            message (Message): The message to edit
+            text (str): Its new text
+            final (bool, optional): Whether this is the last edit of a reply. Defaults to False.
+            
+        Returns:
+            bool: Whether the message shows the text
+        """
+        for attempt in range(1, (EDIT_ATTEMPTS if final else 1) + 1):
+            try:
+                await message.edit_text(text)
+                return True
+            except RetryAfter as e:
+                self.logger.error(f"flood control on edit, waiting {e.retry_after}s")
+                if final and attempt == EDIT_ATTEMPTS:
+                    break
+                # progressive edits wait too, so the next one isn't throttled again
+                await asyncio.sleep(e.retry_after)
+            except BadRequest as e:
+                # "message is not modified" and friends, the user already sees the text
+                self.logger.error(f"failed to edit message: {e}")
+                return "not modified" in str(e)
+            except TelegramError as e:
+                # timeouts and network errors
+                self.logger.error(f"failed to edit message (attempt {attempt}): {e}")
+                if final and attempt < EDIT_ATTEMPTS:
+                    await asyncio.sleep(EDIT_INTERVAL)
+        return False
     
     async def echo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if update.effective_chat is None \
@@ -731,14 +937,8 @@ class TEL:
         db = self.mdb.client["network"]
         people = db["people"]
         
-        existing_user = people.find_one({"telegram_username": tu})
-        if not existing_user:
-            self.logger.info(
-                f"can't archive message for {tu}, user not found in DB."
-            )
-            return
-        
-        people.update_one(
+        result = await self.mdb.run(
+            people.update_one,
             {"telegram_username": tu},
             {
                 "$push": {
@@ -746,6 +946,12 @@ class TEL:
                 }
             }
         )
+        if result.matched_count == 0:
+            self.logger.info(
+                f"can't archive message for {tu}, user not found in DB."
+            )
+            return
+        self.summarizer.schedule(tu)
         
         
 
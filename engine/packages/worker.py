@@ -60,12 +60,12 @@ class TWTW:
         return self.client.get_cookies()
 
     async def uid(self, username):
-        return self.kv.red.get(username) or await self.cuid(username)
+        return await self.kv.red.get(username) or await self.cuid(username)
 
     async def cuid(self, username) -> str:
         usr = await self.client.get_user_by_screen_name(username)
         uid = usr.id
-        self.kv.red.set(username, uid)
+        await self.kv.red.set(username, uid)
         self.logger.info(f"cached uid for {username}: {uid}")
         return uid
 
@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import textwrap
+import time
+from engine.agent.prompt import PromptBuilder
+from engine.agent.router import URLS
+from engine.packages.log import Logger
+from engine.scripts.fakes import FakeBot, FakeContext, FakeGithub, FakeRed, FakeTWTW, FakeTwitterClient, Persona, Service
+from engine.scripts.stub import PROFILES
+
+logger = Logger("bench", persist=True)
+
+
+def history(turns: int) -> list[str]:
+    return [
+        f"{'user' if i % 2 else 'nader'}: message {i} about rust, zk circuits and the indexer I'm shipping this week"
+        for i in range(turns)
+    ]
+
+
+def scenarios(turns: int, repos: int, jobs: int) -> dict[str, str]:
+    """
+    Builds one prompt per prompt key the way the orchestrator stages and the
+    telegram handlers do, filled with synthetic candidate data.
+
+    Args:
+        turns (int): Messages of conversation history per candidate
+        repos (int): GitHub repositories per candidate
+        jobs (int): Open jobs on the board
+
+    Returns:
+        dict[str, str]: Prompt per prompt key
+    """
+    from engine.orchestrator.orchestrator import prompts as stages, README_TOKENS
+    from engine.packages.telegram import prompts as handlers, RECENT_TURNS
+
+    def conversation(prompt: str) -> str:
+        lines = history(turns)
+        builder = PromptBuilder().fixed(prompt)
+        builder.section("Older Messages", lines[:-RECENT_TURNS], priority=2, keep="last")
+        builder.section("Prior Messages", lines[-RECENT_TURNS:], priority=0, keep="last")
+        return builder.build()
+
+    details = textwrap.dedent("""
+        HERE'S WHAT YOU KNOW ABOUT THIS CANDIDATE:
+        User: benchdev
+        Most Recent Message: been hacking on a rust zk prover, github is benchdev
+    """)
+
+    testing = PromptBuilder().fixed(stages["testing"] + "\n- CANDIDATES GitHub Username: benchdev")
+    testing.section(
+        "- CANDIDATES GitHub Repositories (name, stars, description)",
+        [f"repo-{i} ({100 - i} stars): a rust crate for thing {i}" for i in range(repos)],
+        priority=0,
+    )
+    testing.section(
+        "- CANDIDATES GitHub Repositories Readmes",
+        [f"repo-{i}: " + "this crate implements a fast prover. " * 200 for i in range(repos)],
+        priority=1,
+        cap=README_TOKENS,
+    )
+
+    board = "\n\n".join(
+        f"Job ID: job-{i}\nCompany: Company {i}\nCompany Description: builds L2 infra\nJob Description: rust engineer for proving systems"
+        for i in range(jobs)
+    )
+
+    return {
+        "seed": stages["seed"] + "\n- CANDIDATES Twitter / X Username: benchdev\n- CANDIDATES Last Couple Of Tweets List: ['shipping']",
+        "extract_info": stages["extract_info"].format(previous_messages="\n".join(history(turns))),
+        "testing": testing.build(),
+        "inquire": conversation(handlers["inquire"] + details),
+        "gathering": conversation(handlers["gathering"] + details),
+        "ready": conversation(handlers["ready"] + details),
+        "job_match_evaluation": handlers["job_match_evaluation"].format(
+            github="benchdev",
+            email="bench@example.com",
+            soft_skills=["curious"],
+            hard_skills=["rust"],
+            message_history="\n".join(history(turns)[-10:]),
+            available_jobs=board,
+        ),
+    }
+
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def row(latencies: list[float], errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+    }
+
+
+async def measure(calls: list, concurrency: int) -> dict:
+    """Runs coroutine functions with bounded concurrency and summarizes how long each took."""
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(call):
+        nonlocal errors
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                await call()
+            except Exception as e:
+                logger.error(f"benchmarked call failed: {e}")
+                errors += 1
+            latencies.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    await asyncio.gather(*(one(call) for call in calls))
+    return row(latencies, errors, time.monotonic() - started)
+
+
+async def pipeline(args) -> dict:
+    """
+    Runs the orchestrator's per-candidate stages and the bot's message handler
+    end to end, against fake Twitter, GitHub and Telegram, a scratch Mongo and
+    the LLM endpoint under test. Mongo reads and writes, prompt building and
+    state moves are timed along with the completions.
+    """
+    from engine.agent.index import AI
+    from engine.orchestrator.orchestrator import Orchestrator
+    from engine.packages.telegram import TEL
+    from engine.scripts.simulate import REFERRER, database, populate
+
+    rng = random.Random(0)
+    personas = [Persona(i, rng) for i in range(args.candidates * 2)]
+    chatters, candidates = personas[:args.candidates], personas[args.candidates:]
+    twitter = FakeTwitterClient(personas, Service("twitter", args.service_latency, rng=rng))
+    git = FakeGithub(personas, Service("github", args.service_latency, rng=random.Random(1)))
+    bot = FakeBot(Service("telegram", args.service_latency / 4, rng=random.Random(2)))
+    kv = FakeRed()
+
+    mdb = database(args.mongo, args.reset)
+    populate(mdb, personas, args.candidates, args.jobs, twitter)
+    people = mdb.client["network"]["people"]
+    twitter_users = {"x_username": {"$exists": True}}
+
+    ai = AI(kv=kv)
+    tel = TEL(mdb=mdb, kv=kv, ai=ai)
+    orchestrator = Orchestrator(mdb=mdb, kv=kv, twtw=FakeTWTW(twitter), ai=ai, tel=tel, git=git)
+    report = {}
+    try:
+        report["orchestrator:seed"] = await measure(
+            [lambda person=person: orchestrator.seed(person) for person in people.find(twitter_users)],
+            args.concurrency,
+        )
+
+        # every candidate has answered the opener, so each gather pass extracts details
+        await asyncio.gather(*twitter.tasks)
+        report["orchestrator:gather"] = await measure(
+            [lambda person=person: orchestrator.gather_person(person) for person in people.find({**twitter_users, "state": "gathering"})],
+            args.concurrency,
+        )
+        await orchestrator.writes.flush()
+
+        # not every candidate has shared both details yet, testing gets all of them
+        for persona in candidates:
+            people.update_one(
+                {"x_username": persona.x_username},
+                {"$set": {"state": "testing", "github_username": persona.github, "email": persona.email}},
+            )
+        report["orchestrator:test"] = await measure(
+            [lambda person=person: orchestrator.test_person(person) for person in people.find({**twitter_users, "state": "testing"})],
+            args.concurrency,
+        )
+
+        # a user's messages are handled in order, users concurrently
+        latencies, errors = [], 0
+
+        async def chat(persona: Persona):
+            nonlocal errors
+            username = persona.telegram_username
+            await tel.start(bot.update(username, "/start"), FakeContext())
+            await tel.refer(bot.update(username, f"/referred @{REFERRER} BENCH"), FakeContext([f"@{REFERRER}", "BENCH"]))
+            for text in persona.chat():
+                started = time.monotonic()
+                try:
+                    await tel.process(bot.update(username, text), FakeContext())
+                except Exception as e:
+                    logger.error(f"benchmarked call failed: {e}")
+                    errors += 1
+                latencies.append(time.monotonic() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(chat(persona) for persona in chatters))
+        report["telegram:process"] = row(latencies, errors, time.monotonic() - started)
+    finally:
+        await orchestrator.writes.close()
+        mdb.close()
+    return report
+
+
+async def bench(args) -> dict:
+    """Runs every scenario against the LLM endpoint and returns the report."""
+    from engine.agent.index import AI
+
+    ai = AI()
+    report = {}
+
+    for key, content in scenarios(args.turns, args.repos, args.jobs).items():
+        latencies, errors = [], 0
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.monotonic()
+                res = await ai.act(content, key=key)
+                latencies.append(time.monotonic() - started)
+                errors += res["status"] != "success"
+
+        started = time.monotonic()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        elapsed = time.monotonic() - started
+        report[key] = {
+            "requests": args.requests,
+            "errors": errors,
+            "throughput": args.requests / elapsed if elapsed else 0.0,
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+        }
+
+    # time to first token is what telegram users feel in streaming mode
+    firsts, totals = [], []
+    content = scenarios(args.turns, args.repos, args.jobs)["ready"]
+    for _ in range(min(args.requests, 20)):
+        started = time.monotonic()
+        first = None
+        async for _delta in ai.stream(content, key="ready"):
+            first = first or time.monotonic() - started
+        firsts.append(first or 0.0)
+        totals.append(time.monotonic() - started)
+    report["ready:stream"] = {
+        "requests": len(totals),
+        "ttft_p50": percentile(firsts, 0.5),
+        "ttft_p95": percentile(firsts, 0.95),
+        "p50": percentile(totals, 0.5),
+        "p95": percentile(totals, 0.95),
+    }
+
+    if args.pipeline:
+        report.update(await pipeline(args))
+    return report
+
+
+async def main(args) -> int:
+    runner = None
+    if args.url is None:
+        from engine.scripts.stub import Stub
+        runner = await Stub(args.profile, args.recording, seed=0).start(args.port)
+        args.url = f"http://127.0.0.1:{args.port}/v1"
+
+    # route everything to the endpoint under test, never to a paid provider.
+    # emptied rather than removed so a later load_dotenv() can't bring them back
+    os.environ["HYPERBOLIC_BASE_URL"] = args.url
+    os.environ["HYPERBOLIC_API_KEY"] = "bench"
+    os.environ["HYPERBOLIC_QPS"] = str(args.qps)
+    for name in URLS:
+        if name != "HYPERBOLIC":
+            os.environ[f"{name}_API_KEY"] = ""
+    # the pipeline's bot only talks to a fake telegram
+    os.environ["TELEGRAM_TOKEN"] = "0:benchmark"
+
+    try:
+        report = await bench(args)
+    finally:
+        if runner:
+            await runner.cleanup()
+
+    for key, row in report.items():
+        logger.info(f"{key}: " + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    slow = [key for key, row in report.items() if args.max_p95 and row["p95"] > args.max_p95]
+    if slow:
+        logger.error(f"p95 over {args.max_p95}s for: {slow}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the agent layer, orchestrator stages and bot against the stub LLM")
+    parser.add_argument("--url", help="OpenAI compatible base url, defaults to an in-process stub")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--profile", default="fast", choices=sorted(PROFILES), help="stub latency profile")
+    parser.add_argument("--recording", help="JSONL recording for the stub to replay")
+    parser.add_argument("--requests", type=int, default=50, help="requests per prompt key")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--qps", type=float, default=1000)
+    parser.add_argument("--turns", type=int, default=60, help="conversation length per candidate")
+    parser.add_argument("--repos", type=int, default=30, help="repositories per candidate")
+    parser.add_argument("--jobs", type=int, default=50, help="open jobs on the board")
+    parser.add_argument("--candidates", type=int, default=20, help="candidates per orchestrator stage, and telegram users")
+    parser.add_argument(
+        "--mongo",
+        default=os.getenv("SIM_MONGO_URI", "mongodb://localhost:27017"),
+        help="URI of a scratch mongod for the pipeline benchmarks",
+    )
+    parser.add_argument("--reset", action="store_true", help="drop the network and job_board databases first")
+    parser.add_argument("--service-latency", type=float, default=0.2, help="seconds per fake twitter and github call")
+    parser.add_argument(
+        "--no-pipeline",
+        dest="pipeline",
+        action="store_false",
+        help="only time completions, without the orchestrator and bot or a Mongo",
+    )
+    parser.add_argument("--out", help="write the report as JSON")
+    parser.add_argument("--max-p95", type=float, help="exit non-zero if any p95 exceeds this many seconds")
+    sys.exit(asyncio.run(main(parser.parse_args())))
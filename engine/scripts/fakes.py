@@ -0,0 +1,300 @@
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from telegram.error import RetryAfter
+from twikit.errors import Forbidden
+from engine.packages.metrics import Metrics
+
+# DMs per page of fake history, newest first like twitter
+PAGE = 20
+
+
+class Service:
+    """Latency and failure model of one external service."""
+
+    def __init__(self, name: str, latency: float, jitter: float = 0.3, errors: float = 0.0, rng: Optional[random.Random] = None):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.errors = errors
+        self.random = rng or random.Random()
+
+    def delay(self) -> float:
+        return max(0.0, self.latency * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def failed(self) -> bool:
+        return self.random.random() < self.errors
+
+    async def call(self, op: str):
+        """Waits out one call and raises if it's one of the failing ones."""
+        await asyncio.sleep(self.delay())
+        self.count(op)
+
+    def call_sync(self, op: str):
+        time.sleep(self.delay())
+        self.count(op)
+
+    def count(self, op: str):
+        if self.failed():
+            Metrics.inc("sim_calls_total", service=self.name, op=op, outcome="error")
+            raise Exception(f"simulated {self.name} error in {op}")
+        Metrics.inc("sim_calls_total", service=self.name, op=op, outcome="ok")
+
+
+class Persona:
+    """A synthetic candidate and how they behave in a conversation."""
+
+    def __init__(self, index: int, rng: random.Random):
+        self.index = index
+        self.x_username = f"sim_builder_{index}"
+        self.telegram_username = f"sim_tg_{index}"
+        self.github = f"sim-dev-{index}"
+        self.email = f"dev{index}@sim.example"
+        self.uid = str(10_000 + index)
+        # some never answer and end up stalled
+        self.responsive = rng.random() < 0.8
+        # seconds before answering a DM
+        self.reply_delay = rng.uniform(0.5, 3.0)
+        # candidate turn on which they share their github, then their email
+        self.reveal = rng.randint(1, 3)
+        self.hard = rng.sample(["rust", "solidity", "go", "zk circuits", "cryptography", "typescript", "distributed systems"], 3)
+        self.soft = rng.sample(["curious", "collaborative", "ships fast", "clear writer", "mentor"], 2)
+        pushed = datetime.now() - timedelta(days=rng.randint(1, 400))
+        self.repos = [
+            {
+                "name": f"project-{index}-{i}",
+                "stars": rng.randint(0, 500),
+                "description": f"a {rng.choice(self.hard)} project",
+                "pushed_at": (pushed - timedelta(days=i)).isoformat(),
+            }
+            for i in range(rng.randint(2, 12))
+        ]
+        self.turns = 0
+
+    def tweets(self) -> list[str]:
+        return [f"shipping more {skill} this week" for skill in self.hard]
+
+    def answer(self) -> str:
+        """Next DM from the candidate, sharing details as the conversation goes on."""
+        self.turns += 1
+        if self.turns < self.reveal:
+            return f"hey, mostly doing {self.hard[0]} lately, what's this about?"
+        if self.turns == self.reveal:
+            return f"sure, my github is github.com/{self.github}"
+        return f"you can reach me at {self.email}"
+
+    def chat(self) -> list[str]:
+        """Telegram messages the candidate sends after being referred."""
+        return [
+            f"hey! I'm mostly building {self.hard[0]} stuff",
+            f"my github is github.com/{self.github} and my email is {self.email}",
+            f"hard skills: {', '.join(self.hard)}. soft skills: {', '.join(self.soft)}",
+            "anything interesting for me?",
+            "cool, what kind of teams are in the network?",
+        ]
+
+
+class Message:
+    _ids = itertools.count(1_000_000)
+
+    def __init__(self, sender_id: str, text: str):
+        self.id = str(next(Message._ids))
+        self.sender_id = sender_id
+        self.text = text
+        self.time = str(int(time.time() * 1000))
+
+
+class History(list):
+    def __init__(self, messages: list[Message], rest: list[Message], service: Service):
+        super().__init__(messages)
+        self.rest = rest
+        self.service = service
+
+    async def next(self) -> "History":
+        await self.service.call("get_dm_history")
+        return History(self.rest[:PAGE], self.rest[PAGE:], self.service)
+
+
+class FakeTwitterClient:
+    """The parts of twikit's Client the pipeline uses, with candidates answering DMs."""
+
+    me = "1"
+
+    def __init__(self, personas: list[Persona], service: Service, forbidden: float = 0.0):
+        self.service = service
+        self.forbidden = forbidden
+        self.personas = {p.uid: p for p in personas}
+        self.users = {p.x_username: p for p in personas}
+        self.conversations: dict[str, list[Message]] = {p.uid: [] for p in personas}
+        self.tasks: set[asyncio.Task] = set()
+
+    async def get_user_by_screen_name(self, username: str):
+        await self.service.call("get_user_by_screen_name")
+        persona = self.users[username]
+        return type("User", (), {"id": persona.uid, "name": persona.x_username, "description": "builder"})()
+
+    async def get_dm_history(self, user_id: str, max_id: Optional[str] = None):
+        await self.service.call("get_dm_history")
+        messages = list(reversed(self.conversations[user_id]))
+        return History(messages[:PAGE], messages[PAGE:], self.service)
+
+    async def send_dm(self, user_id: str, text: str):
+        await self.service.call("send_dm")
+        if self.service.random.random() < self.forbidden:
+            raise Forbidden(f"simulated: can't DM {user_id}")
+        message = Message(self.me, text)
+        self.conversations[user_id].append(message)
+
+        persona = self.personas[user_id]
+        if persona.responsive:
+            task = asyncio.create_task(self.answer(persona))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return message
+
+    async def answer(self, persona: Persona):
+        await asyncio.sleep(persona.reply_delay)
+        self.conversations[persona.uid].append(Message(persona.uid, persona.answer()))
+
+    def open(self, persona: Persona, text: str):
+        """Puts an opener in a conversation, as if the seed stage had sent it."""
+        self.conversations[persona.uid].append(Message(self.me, text))
+        if persona.responsive:
+            task = asyncio.get_running_loop().create_task(self.answer(persona))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+
+class FakeTWTW:
+    """Stands in for engine.packages.worker.TWTW."""
+
+    def __init__(self, client: FakeTwitterClient):
+        self.client = client
+
+    async def login(self, *args, **kwargs):
+        return True
+
+    async def uid(self, username: str) -> str:
+        return self.client.users[username].uid
+
+
+class FakeGithub:
+    """Stands in for engine.packages.github.GithubWorker, blocking like the real one."""
+
+    def __init__(self, personas: list[Persona], service: Service):
+        self.service = service
+        self.personas = {p.github: p for p in personas}
+
+    def get_user_repositories(self, username: str):
+        self.service.call_sync("get_user_repositories")
+        persona = self.personas.get(username)
+        return [dict(repo) for repo in persona.repos] if persona else None
+
+    def get_repo_readme(self, username: str, repo_name: str):
+        self.service.call_sync("get_repo_readme")
+        return f"# {repo_name}\n" + "This project explores fast proving and clean APIs. " * 40
+
+
+class FakeMessage:
+    """A sent or received Telegram message with the methods the bot calls on it."""
+
+    def __init__(self, bot: "FakeBot", chat: str, text: str):
+        self.bot = bot
+        self.chat = chat
+        self.text = text
+
+    async def reply_text(self, text: str) -> "FakeMessage":
+        await self.bot.service.call("send_message")
+        message = FakeMessage(self.bot, self.chat, text)
+        self.bot.sent.setdefault(self.chat, []).append(message)
+        return message
+
+    async def edit_text(self, text: str):
+        # telegram's flood control, the bot waits it out and retries
+        if self.bot.service.random.random() < self.bot.flood:
+            Metrics.inc("sim_calls_total", service=self.bot.service.name, op="edit_message_text", outcome="flood")
+            raise RetryAfter(1)
+        await self.bot.service.call("edit_message_text")
+        self.text = text
+
+
+class FakeUpdate:
+    def __init__(self, bot: "FakeBot", username: str, text: str):
+        self.effective_user = type("User", (), {"username": username})()
+        self.message = FakeMessage(bot, username, text)
+
+
+class FakeContext:
+    def __init__(self, args: Optional[list[str]] = None):
+        self.args = args or []
+
+
+class FakeBot:
+    """Builds updates for the TEL handlers and records what the bot sent back."""
+
+    def __init__(self, service: Service, flood: float = 0.0):
+        self.service = service
+        self.flood = flood
+        self.sent: dict[str, list[FakeMessage]] = {}
+
+    def update(self, username: str, text: str) -> FakeUpdate:
+        return FakeUpdate(self, username, text)
+
+
+class FakeRed:
+    """In-memory stand-in for engine.packages.red.Red, covering what the simulated processes call."""
+
+    def __init__(self):
+        self.red = self
+        self.values: dict[str, tuple[str, Optional[float]]] = {}
+
+    def alive(self, key: str) -> bool:
+        value = self.values.get(key)
+        if value is None:
+            return False
+        if value[1] is not None and value[1] < time.monotonic():
+            del self.values[key]
+            return False
+        return True
+
+    async def get(self, key: str):
+        return self.values[key][0] if self.alive(key) else None
+
+    async def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False):
+        if nx and self.alive(key):
+            return None
+        self.values[key] = (str(value), time.monotonic() + ex if ex else None)
+        return True
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self.values[key] = (str(value), self.values[key][1] if self.alive(key) else None)
+        return value
+
+    async def delete(self, *keys: str):
+        return sum(self.values.pop(key, None) is not None for key in keys)
+
+    async def ttl(self, key: str) -> int:
+        if not self.alive(key):
+            return -2
+        expires = self.values[key][1]
+        return -1 if expires is None else int(expires - time.monotonic())
+
+    async def publish(self, channel: str, message) -> int:
+        return 0
+
+    def pubsub(self):
+        return FakePubSub()
+
+
+class FakePubSub:
+    async def subscribe(self, *channels):
+        pass
+
+    async def listen(self):
+        # nothing is ever broadcast in a simulation
+        await asyncio.Event().wait()
+        yield {}
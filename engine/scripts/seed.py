@@ -32,7 +32,7 @@ async def seed_network():
     people = db["people"]
 
     for usr in seed:
-        if people.find_one({"x_username": usr.get("x_username")}):
+        if people.find_one({"x_username": usr.get("x_username")}, {"_id": 1}):
             logger.info(f"user {usr.get('x_username')} already exists, skipping")
             continue
         
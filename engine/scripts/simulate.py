@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from datetime import datetime
+from engine.agent.router import URLS
+from engine.packages.log import Logger
+from engine.packages.metrics import Metrics
+from engine.packages.mongo import MDB
+from engine.scripts.fakes import FakeBot, FakeContext, FakeGithub, FakeRed, FakeTWTW, FakeTwitterClient, Persona, Service
+
+logger = Logger("simulate", persist=True)
+
+# states a twitter candidate doesn't leave
+TERMINAL = {"accepted", "rejected", "stalled"}
+REFERRER = "sim_referrer"
+
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples: list[float]) -> dict:
+    return {"count": len(samples), "p50": percentile(samples, 0.5), "p95": percentile(samples, 0.95), "max": max(samples, default=0.0)}
+
+
+def database(uri: str, reset: bool) -> MDB:
+    """
+    Connects to the Mongo the simulation runs against. It has to be a real
+    mongod, e.g. `docker run -p 27017:27017 mongo:7`, since the batched writes
+    and partial indexes aren't supported by in-memory fakes. It must be empty
+    or explicitly reset, it's written to under the same network and job_board
+    databases as production.
+    """
+    mdb = MDB(uri)
+    try:
+        mdb.connect()
+    except Exception as e:
+        raise SystemExit(f"can't reach Mongo at {uri}, start a local mongod or point --mongo at a scratch one: {e}")
+    if reset:
+        mdb.client.drop_database("network")
+        mdb.client.drop_database("job_board")
+    elif mdb.client["network"]["people"].estimated_document_count():
+        raise SystemExit(f"network.people on {uri} isn't empty, point --mongo at a scratch database or pass --reset")
+    return mdb
+
+
+def populate(mdb: MDB, personas: list[Persona], telegram: int, jobs: int, twitter: FakeTwitterClient):
+    """Seeds twitter candidates mid-conversation, a referrer for the telegram ones, and open jobs."""
+    people = mdb.client["network"]["people"]
+    now = datetime.now()
+    people.insert_many([
+        {
+            "x_username": p.x_username,
+            "x_name": p.x_username,
+            "x_bio": "builder",
+            "tweets": p.tweets(),
+            # the seed stage doesn't send its opener yet, so candidates start right after it
+            "state": "gathering",
+            "created_at": now,
+            "refferal": False,
+            "dm": [],
+        }
+        for p in personas[telegram:]
+    ])
+    for p in personas[telegram:]:
+        twitter.open(p, "yo, saw your tweets. what are you building right now?")
+
+    people.insert_one({"telegram_username": REFERRER, "state": "ready", "created_at": now, "messages": []})
+    if jobs:
+        mdb.client["job_board"]["jobs"].insert_many([
+            {
+                "companyName": f"Sim Company {i}",
+                "companyDescription": "builds infrastructure for onchain apps",
+                "jobDescription": f"engineer for {random.choice(['rust', 'solidity', 'go', 'zk circuits'])} systems",
+                "calComLink": f"https://cal.example/sim-{i}",
+                "contactEmail": f"hiring{i}@sim.example",
+                "status": "not started",
+                "created_at": now,
+            }
+            for i in range(jobs)
+        ])
+
+
+async def converse(tel, bot: FakeBot, persona: Persona, latencies: list[float], pause: float):
+    """Runs one telegram candidate through /start, /referred and a chat, in order."""
+    username = persona.telegram_username
+
+    async def timed(handler, text, args=None):
+        started = time.monotonic()
+        await handler(bot.update(username, text), FakeContext(args))
+        latencies.append(time.monotonic() - started)
+
+    await timed(tel.start, "/start")
+    await timed(tel.refer, f"/referred @{REFERRER} SIMCODE", [f"@{REFERRER}", "SIMCODE"])
+    for text in persona.chat():
+        await asyncio.sleep(pause)
+        await timed(tel.process, text)
+
+
+def funnel(people: list[dict]) -> dict:
+    """Time spent per transition and from creation to a terminal state, from state_history."""
+    steps: dict[str, list[float]] = {}
+    total = []
+    for person in people:
+        previous = person.get("created_at")
+        for step in person.get("state_history") or []:
+            if previous is not None:
+                steps.setdefault(f"{step['from']}->{step['to']}", []).append((step["at"] - previous).total_seconds())
+            previous = step["at"]
+        if person.get("state") in TERMINAL and person.get("state_at") and person.get("created_at"):
+            total.append((person["state_at"] - person["created_at"]).total_seconds())
+    return {"steps": {name: summarize(samples) for name, samples in steps.items()}, "end_to_end": summarize(total)}
+
+
+def counters(name: str) -> dict:
+    return {
+        ",".join(f"{k}={v}" for k, v in row["labels"].items()) or "total": row["value"]
+        for row in Metrics.snapshot()["counters"].get(name, [])
+    }
+
+
+async def simulate(args) -> dict:
+    from engine.agent.index import AI
+    from engine.orchestrator.orchestrator import Orchestrator
+    from engine.orchestrator.scheduler import Scheduler
+    from engine.packages.telegram import TEL
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    personas = [Persona(i, rng) for i in range(args.telegram + args.candidates)]
+
+    twitter = FakeTwitterClient(personas, Service("twitter", args.twitter_latency, errors=args.error_rate, rng=rng))
+    git = FakeGithub(personas, Service("github", args.github_latency, errors=args.error_rate, rng=random.Random(args.seed + 1)))
+    bot = FakeBot(Service("telegram", args.telegram_latency, rng=random.Random(args.seed + 2)), flood=args.flood_rate)
+    kv = FakeRed()
+
+    mdb = database(args.mongo, args.reset)
+    populate(mdb, personas, args.telegram, args.jobs, twitter)
+
+    ai = AI(kv=kv)
+    tel = TEL(mdb=mdb, kv=kv, ai=ai)
+    orchestrator = Orchestrator(mdb=mdb, kv=kv, twtw=FakeTWTW(twitter), ai=ai, tel=tel, git=git)
+
+    passes: dict[str, list[float]] = {}
+
+    def timed(name, func):
+        async def run():
+            started = time.monotonic()
+            await func()
+            passes.setdefault(name, []).append(time.monotonic() - started)
+        return run
+
+    scheduler = Scheduler()
+    scheduler.add("seeds", timed("seeds", orchestrator.seeds), args.interval)
+    scheduler.add("gather", timed("gather", orchestrator.gather), args.interval)
+    scheduler.add("testing", timed("testing", orchestrator.testing), args.interval)
+
+    people = mdb.client["network"]["people"]
+    twitter_users = {"x_username": {"$exists": True}}
+    latencies: list[float] = []
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.monotonic()
+
+    runner = asyncio.create_task(scheduler.run())
+    chats = asyncio.gather(*(converse(tel, bot, p, latencies, args.pause) for p in personas[:args.telegram]))
+    try:
+        while time.monotonic() - started < args.duration:
+            await asyncio.sleep(1)
+            done = people.count_documents({**twitter_users, "state": {"$in": list(TERMINAL)}})
+            if done == args.candidates and chats.done():
+                break
+    finally:
+        scheduler.stop()
+        await runner
+        await orchestrator.writes.close()
+        if not chats.done():
+            chats.cancel()
+        await asyncio.gather(chats, return_exceptions=True)
+    elapsed = time.monotonic() - started
+    after = resource.getrusage(resource.RUSAGE_SELF)
+
+    candidates = list(people.find(twitter_users, {"state": 1, "state_history": 1, "state_at": 1, "created_at": 1}))
+    outcomes: dict[str, int] = {}
+    for person in candidates:
+        outcomes[person.get("state")] = outcomes.get(person.get("state"), 0) + 1
+    moved: dict[str, int] = {}
+    for person in candidates:
+        for step in person.get("state_history") or []:
+            moved[step["from"]] = moved.get(step["from"], 0) + 1
+
+    telegram_states: dict[str, int] = {}
+    for person in people.find({"telegram_username": {"$regex": "^sim_tg_"}}, {"state": 1}):
+        telegram_states[person.get("state")] = telegram_states.get(person.get("state"), 0) + 1
+
+    return {
+        "duration": elapsed,
+        "candidates": args.candidates,
+        "stages": {
+            name: {
+                "passes": summarize(samples),
+                "moved": moved.get({"seeds": "seed", "gather": "gathering"}.get(name, name), 0),
+                "throughput": moved.get({"seeds": "seed", "gather": "gathering"}.get(name, name), 0) / elapsed,
+            }
+            for name, samples in passes.items()
+        },
+        "funnel": {**funnel(candidates), "outcomes": outcomes},
+        "telegram": {
+            "users": args.telegram,
+            "messages": summarize(latencies),
+            "throughput": len(latencies) / elapsed,
+            "states": telegram_states,
+        },
+        "llm": {
+            "actions": counters("llm_actions_total"),
+            "tokens": counters("llm_tokens_total"),
+            "cache": counters("llm_cache_total"),
+            "job_matches": counters("job_match_cache_total"),
+        },
+        "services": counters("sim_calls_total"),
+        "mongo": {"bulk_writes": counters("mongo_bulk_writes_total"), "batched_updates": counters("mongo_batched_updates_total")},
+        "resources": {
+            "cpu_user": after.ru_utime - usage.ru_utime,
+            "cpu_system": after.ru_stime - usage.ru_stime,
+            # kilobytes on linux
+            "max_rss_mb": after.ru_maxrss / 1024,
+            "threads": threading.active_count(),
+        },
+    }
+
+
+async def main(args) -> int:
+    runner = None
+    if args.url is None:
+        from engine.scripts.stub import Stub
+        runner = await Stub(args.profile, seed=args.seed).start(args.port)
+        args.url = f"http://127.0.0.1:{args.port}/v1"
+
+    # never reach a real provider or the real bot from a simulation
+    os.environ["HYPERBOLIC_BASE_URL"] = args.url
+    os.environ["HYPERBOLIC_API_KEY"] = "sim"
+    os.environ["HYPERBOLIC_QPS"] = str(args.qps)
+    for name in URLS:
+        if name != "HYPERBOLIC":
+            os.environ[f"{name}_API_KEY"] = ""
+    os.environ["TELEGRAM_TOKEN"] = "0:simulated"
+    # candidates answer within seconds, so nudges come after a few passes instead of a day
+    os.environ.setdefault("GATHER_NUDGE_AFTER", str(args.interval * 3))
+
+    try:
+        report = await simulate(args)
+    finally:
+        if runner:
+            await runner.cleanup()
+
+    logger.info(json.dumps(report, indent=2, default=str))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline simulation of the orchestrator and bot against fake services")
+    parser.add_argument("--candidates", type=int, default=50, help="synthetic twitter candidates")
+    parser.add_argument("--telegram", type=int, default=20, help="synthetic telegram candidates")
+    parser.add_argument("--jobs", type=int, default=30, help="open jobs on the board")
+    parser.add_argument(
+        "--mongo",
+        default=os.getenv("SIM_MONGO_URI", "mongodb://localhost:27017"),
+        help="URI of a scratch mongod, a local one by default",
+    )
+    parser.add_argument("--reset", action="store_true", help="drop the network and job_board databases first")
+    parser.add_argument("--duration", type=float, default=120, help="max seconds to run")
+    parser.add_argument("--interval", type=float, default=2, help="seconds between stage passes")
+    parser.add_argument("--pause", type=float, default=0.5, help="seconds between a telegram candidate's messages")
+    parser.add_argument("--url", help="OpenAI compatible base url, defaults to an in-process stub")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--profile", default="fast", help="stub latency profile")
+    parser.add_argument("--qps", type=float, default=1000)
+    parser.add_argument("--twitter-latency", type=float, default=0.3)
+    parser.add_argument("--github-latency", type=float, default=0.2)
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.01, help="failure rate of twitter and github calls")
+    parser.add_argument("--flood-rate", type=float, default=0.02, help="rate of telegram flood control on edits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the report as JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+import uuid
+from aiohttp import web
+from engine.agent.prompt import tokens
+from engine.packages.log import Logger
+
+# latency profiles: seconds to first token, tokens per second, jitter fraction, error rate
+PROFILES = {
+    "instant": {"ttft": 0.0, "tps": 0, "jitter": 0.0, "errors": 0.0},
+    "fast": {"ttft": 0.2, "tps": 150, "jitter": 0.2, "errors": 0.0},
+    "hyperbolic": {"ttft": 0.8, "tps": 45, "jitter": 0.3, "errors": 0.01},
+    "slow": {"ttft": 3.0, "tps": 15, "jitter": 0.5, "errors": 0.05},
+}
+
+# canned replies per prompt key, used when nothing was recorded for a key
+CANNED = {
+    # the seed prompt asks for the opener itself, not JSON
+    "seed": "yo, saw your tweets about rollups. what are you building right now?",
+    "gather": {"message": "nice. drop your github and email so I can take a proper look."},
+    "reffered": {"message": "welcome in. tell me what you're shipping."},
+    "inquire": {"message": "solid. what's your github and email?", "action": "pass"},
+    "gathering": {
+        "message": "got it, thanks.",
+        "extracted": {"github": "stubdev", "email": "stub@example.com", "soft": ["curious"], "hard": ["rust"]},
+    },
+    "ready": {"message": "you're in. I'll ping you when something fits."},
+    "job_match": {"message": "there's a team that needs exactly you. interested?", "provide_link": False},
+    "job_match_evaluation": {"match_found": False, "job_id": None, "match_reason": ""},
+    "extract_info": {"github_username": "stubdev", "email": "stub@example.com", "confidence": "high"},
+    "testing": {"fit_score": 72, "comments": "ships real systems code"},
+    "summary": {"summary": "builder working on rust tooling, shared github and email."},
+}
+
+
+GITHUB = re.compile(r"github\.com/([A-Za-z0-9-]+)|github(?: username)?(?: is|:) @?(?!github\.com)([A-Za-z0-9-]+)", re.IGNORECASE)
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+SKILLS = re.compile(r"(hard|soft) skills: ([^.\n]+)", re.IGNORECASE)
+
+
+class Stub:
+    """
+    OpenAI compatible chat completions server for offline runs. Replies are
+    replayed per prompt key (sent by the client as the X-Prompt-Key header) from
+    a recording, falling back to canned replies, paced by a latency profile.
+    """
+
+    def __init__(self, profile: str = "fast", recording: str | None = None, seed: int | None = None):
+        """
+        Initialize the Stub.
+
+        Args:
+            profile (str, optional): Name of a latency profile in PROFILES. Defaults to "fast".
+            recording (str, optional): JSONL file of {"key", "output"} lines written with LLM_RECORD
+            seed (int, optional): Seed for latency jitter and injected errors
+        """
+        self.profile = PROFILES[profile]
+        self.random = random.Random(seed)
+        self.logger = Logger("stub", persist=True)
+        self.replies: dict[str, itertools.cycle] = {}
+
+        recorded: dict[str, list[str]] = {}
+        if recording:
+            with open(recording) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        recorded.setdefault(entry.get("key") or "unknown", []).append(entry["output"])
+        for key, outputs in recorded.items():
+            self.replies[key] = itertools.cycle(outputs)
+
+    def reply(self, key: str, prompt: str = "") -> str:
+        if key in self.replies:
+            return next(self.replies[key])
+        reply = self.canned(key, prompt)
+        return reply if isinstance(reply, str) else json.dumps(reply)
+
+    def canned(self, key: str, prompt: str) -> dict | str:
+        """
+        Canned reply for a key, filled from the prompt where the pipeline depends
+        on it: extracted details come from what the candidate actually wrote, so
+        simulated candidates move through the funnel only once they've shared them.
+        """
+        reply = json.loads(json.dumps(CANNED.get(key, {"message": "ok"})))
+        if key == "extract_info":
+            said = "\n".join(line for line in prompt.splitlines() if line.strip().startswith("them:"))
+            github, email = GITHUB.search(said), EMAIL.search(said)
+            reply.update(github_username=(github.group(1) or github.group(2)) if github else None, email=email.group() if email else None)
+        elif key == "gathering":
+            recent = prompt.split("Most Recent Message:", 1)[-1].split("\n", 1)[0]
+            github, email = GITHUB.search(recent), EMAIL.search(recent)
+            skills = {kind.lower(): [s.strip() for s in found.split(",") if s.strip()] for kind, found in SKILLS.findall(recent)}
+            reply["extracted"] = {
+                "github": (github.group(1) or github.group(2)) if github else None,
+                "email": email.group() if email else None,
+                "soft": skills.get("soft", []),
+                "hard": skills.get("hard", []),
+            }
+        elif key == "testing":
+            reply["fit_score"] = self.random.randint(30, 95)
+        elif key == "job_match_evaluation":
+            jobs = re.findall(r"Job ID: (\S+)", prompt)
+            if jobs and self.random.random() < 0.3:
+                reply.update(match_found=True, job_id=self.random.choice(jobs), match_reason="skills line up with the role")
+        return reply
+
+    def delay(self, base: float) -> float:
+        jitter = self.profile["jitter"]
+        return max(0.0, base * (1 + self.random.uniform(-jitter, jitter)))
+
+    async def completions(self, request: web.Request):
+        body = await request.json()
+        key = request.headers.get("X-Prompt-Key", "unknown")
+        model = body.get("model", "stub")
+        prompt_tokens = sum(tokens(m.get("content") or "") for m in body.get("messages", []))
+
+        await asyncio.sleep(self.delay(self.profile["ttft"]))
+        if self.random.random() < self.profile["errors"]:
+            return web.json_response({"error": {"message": "injected stub error", "type": "server_error"}}, status=500)
+
+        prompt = next((m.get("content") or "" for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "")
+        output = self.reply(key, prompt)
+        completion_tokens = tokens(output)
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.generation(completion_tokens))
+            return web.json_response({
+                "id": cid,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": output}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        # roughly one token per chunk, a token being ~3.5 characters
+        pieces = [output[i:i + 4] for i in range(0, len(output), 4)]
+        for piece in pieces:
+            chunk = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.generation(1))
+        done = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        await response.write(f"data: {json.dumps(done)}\n\n".encode())
+        if (body.get("stream_options") or {}).get("include_usage"):
+            final = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model, "choices": [], "usage": usage}
+            await response.write(f"data: {json.dumps(final)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def generation(self, count: int) -> float:
+        return self.delay(count / self.profile["tps"]) if self.profile["tps"] else 0.0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.completions)
+        app.router.add_get("/v1/models", lambda _: web.json_response({"object": "list", "data": [{"id": "stub", "object": "model"}]}))
+        return app
+
+    async def start(self, port: int) -> web.AppRunner:
+        """
+        Starts serving on localhost inside the running event loop.
+
+        Args:
+            port (int): Port to listen on
+
+        Returns:
+            web.AppRunner: Runner to clean up with await runner.cleanup()
+        """
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        self.logger.info(f"stub llm serving on http://127.0.0.1:{port}/v1")
+        return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI compatible stub LLM server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--profile", choices=PROFILES, default="fast")
+    parser.add_argument("--recording", help="JSONL recording written with LLM_RECORD")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    stub = Stub(args.profile, args.recording, args.seed)
+    web.run_app(stub.app(), host="127.0.0.1", port=args.port)
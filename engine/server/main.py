@@ -4,6 +4,9 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 import os
 from engine.packages.mongo import MDB
+from engine.packages.red import Red
+from engine.packages.jobs import bump_version
+from engine.packages import indexes
 from typing import Annotated
 import asyncio
 from functools import wraps
@@ -18,6 +21,8 @@ class MongoJSONEncoder(json.JSONEncoder):
         return super().default(o)
 
 app = FastAPI()
+# job indexes in the bot follow the version this bumps on every new job
+kv = Red()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -54,6 +59,16 @@ class JobSubmission(BaseModel):
 class Job(JobSubmission):
     status: str = "not started"
     created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+@app.on_event("startup")
+async def ensure_indexes():
+    mongo = MDB()
+    await asyncio.to_thread(mongo.connect)
+    try:
+        await asyncio.to_thread(indexes.ensure, mongo)
+    finally:
+        mongo.close()
 
 @app.get("/")
 def root():
@@ -75,6 +90,7 @@ async def create_job(
     result = await asyncio.to_thread(
         lambda: job_collection.insert_one(job_dict)
     )
+    await bump_version(kv)
     
     # Convert ObjectId to string to make it JSON serializable
     job_id = str(result.inserted_id)